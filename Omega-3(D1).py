@@ -1,34 +1,1046 @@
+import argparse
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import binascii
 import imaplib
-import email
-from textblob import TextBlob
+from email.feedparser import BytesFeedParser
+from email.message import Message
+import hashlib
+import html
+import importlib.util
+import json
+import mmap
+import os
+import quopri
+import re
+import select
+import sqlite3
+import ssl
+import threading
+import time
+from xml.etree import ElementTree
 import sys
 
 # Ensure UTF-8 encoding for stdout (useful for Termux or non-UTF-8 environments)
 sys.stdout.reconfigure(encoding='utf-8')
 
+# Headers plus the leading slice of the body text. BODY.PEEK leaves the \Seen flag alone,
+# and the partial fetch keeps large attachments from being downloaded in full.
+FETCH_ITEMS = '(UID BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{max_bytes}>)'
+
+# Pieces of an imaplib FETCH response
+FETCH_START = re.compile(rb'^\d+ \(')
+FETCH_UID = re.compile(rb'UID (\d+)')
+FETCH_SECTION = re.compile(rb'BODY\[([A-Z.]*)\](?:<\d+>)? \{\d+\}$')
+
+# Words scored against the sentiment lexicon; as in TextBlob's pattern analyzer, a preceding
+# negation flips and halves a word's polarity, an adverb ("very") is not scored itself but
+# multiplies the polarity of the word after it by its intensity, and "!" boosts the word before it
+WORD = re.compile(r"[a-z][a-z'-]*|!")
+NEGATIONS = ['no', 'not', 'never']
+
+# Messages handed to a classifier in one call
+CLASSIFY_CHUNK = 32
+
+# Bytes handed to the MIME feed parser at a time
+FEED_CHUNK = 65536
+
+# Markup removed from text/html parts: script/style blocks, then any remaining tag
+HTML_SKIP = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+HTML_TAG = re.compile(r'<[^>]*>')
+
+# RFC 2177: re-issue IDLE before the server's 30 minute inactivity timeout
+IDLE_TIMEOUT = 29 * 60
+MAX_BACKOFF = 300
+
+class CheckpointStore:
+    """
+    SQLite record of what has already been scanned, keyed by account, folder and UIDVALIDITY.
+    Holds the highest UID scanned per folder and the verdict for each message.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                account TEXT, folder TEXT, uidvalidity INTEGER, last_uid INTEGER,
+                PRIMARY KEY (account, folder));
+            CREATE TABLE IF NOT EXISTS verdicts (
+                account TEXT, folder TEXT, uidvalidity INTEGER, uid INTEGER,
+                subject TEXT, phishing INTEGER,
+                PRIMARY KEY (account, folder, uidvalidity, uid));
+        """)
+
+    def last_uid(self, account, folder, uidvalidity):
+        """Return the highest UID already scanned, or 0 if the folder needs a full scan."""
+        row = self.conn.execute(
+            "SELECT uidvalidity, last_uid FROM checkpoints WHERE account = ? AND folder = ?",
+            (account, folder)).fetchone()
+        if row is None:
+            return 0
+        if row[0] != uidvalidity:
+            # UIDs from the old validity period no longer identify the same messages
+            print(f"UIDVALIDITY changed for {folder}; rescanning all messages.")
+            self.reset(account, folder)
+            return 0
+        return row[1]
+
+    def reset(self, account, folder):
+        """Forget the checkpoint and verdicts of a folder."""
+        with self.conn:
+            self.conn.execute("DELETE FROM verdicts WHERE account = ? AND folder = ?",
+                              (account, folder))
+            self.conn.execute("DELETE FROM checkpoints WHERE account = ? AND folder = ?",
+                              (account, folder))
+
+    def save(self, account, folder, uidvalidity, results):
+        """Store a batch of (uid, subject, is_phishing) verdicts and advance the checkpoint."""
+        if not results:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?)",
+                [(account, folder, uidvalidity, uid, subject, int(is_phishing))
+                 for uid, subject, is_phishing in results])
+            self.conn.execute(
+                "INSERT INTO checkpoints VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (account, folder) DO UPDATE SET uidvalidity = excluded.uidvalidity, "
+                "last_uid = MAX(last_uid, excluded.last_uid)",
+                (account, folder, uidvalidity, max(uid for uid, _, _ in results)))
+
+    def close(self):
+        self.conn.close()
+
+class IndicatorMatcher:
+    """
+    Aho-Corasick automaton over a set of phishing indicators (phrases, domains, URL fragments).
+    Reports every indicator present in a single case-insensitive pass over the text.
+    """
+
+    def __init__(self, indicators):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        indicators = sorted({indicator.lower() for indicator in indicators})
+        for indicator in indicators:
+            self._add(indicator)
+        self._link()
+        # Identifies the indicator set, so cached verdicts from a different feed are not reused
+        self.digest = hashlib.sha256('\n'.join(indicators).encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def from_file(cls, path):
+        """Load indicators from a feed file: one per line, blank lines and '#' comments ignored."""
+        with open(path, encoding='utf-8') as feed:
+            return cls(line.strip() for line in feed if line.strip() and not line.startswith('#'))
+
+    def _add(self, indicator):
+        state = 0
+        for char in indicator:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        if indicator and indicator not in self.output[state]:
+            self.output[state] += (indicator,)
+
+    def _link(self):
+        """Compute failure links breadth-first and fold suffix matches into each state's output."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] += self.output[self.fail[child]]
+
+    def find(self, text):
+        """Return the indicators found in the text, in order of first appearance."""
+        goto, fail, output = self.goto, self.fail, self.output
+        hits = {}
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for indicator in output[state]:
+                hits.setdefault(indicator)
+        return list(hits)
+
+# Active indicator set; replaced by load_indicators() when a feed file is given
+DEFAULT_INDICATORS = ["urgent", "click here", "verify now"]
+indicator_matcher = IndicatorMatcher(DEFAULT_INDICATORS)
+
+def load_indicators(path):
+    """Replace the active indicator set with the contents of a feed file, if one is given."""
+    global indicator_matcher
+    if path:
+        indicator_matcher = IndicatorMatcher.from_file(path)
+
+class VerdictCache:
+    """
+    Verdicts keyed by a hash of the normalized body text, so repeated campaign and
+    newsletter bodies are classified once. A bounded in-memory LRU tier sits in front
+    of an optional SQLite tier that can be shared across accounts, processes and runs.
+    """
+
+    def __init__(self, max_entries=10000, path=None):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        # Scans of several mailboxes may classify in threads of the same process
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            # A lost cache write only costs a reclassification, so skip the per-commit fsync
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS verdict_cache (digest TEXT PRIMARY KEY, reasons TEXT)")
+
+    @staticmethod
+    def key(email_content):
+        """Hash the whitespace- and case-normalized body together with the active indicator set and sentiment scorer."""
+        normalized = ' '.join(email_content.lower().split())
+        return hashlib.sha256(
+            f"{indicator_matcher.digest}\0{sentiment_scorer()}\0{normalized}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached reasons for a key, or None on a miss."""
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.conn is not None:
+            row = self.conn.execute("SELECT reasons FROM verdict_cache WHERE digest = ?", (key,)).fetchone()
+            if row is not None:
+                self._remember(key, json.loads(row[0]))
+                return self.entries[key]
+        return None
+
+    def put(self, key, reasons):
+        with self.lock:
+            self._remember(key, reasons)
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("INSERT OR REPLACE INTO verdict_cache VALUES (?, ?)",
+                                      (key, json.dumps(reasons)))
+
+    def _remember(self, key, reasons):
+        self.entries[key] = reasons
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+# Per-process verdict cache; replaced by init_classifier()
+verdict_cache = VerdictCache()
+
+def init_classifier(indicators=None, cache_size=10000, cache_path=None, exact=False, max_text=65536):
+    """
+    Set up the indicator set, sentiment mode, text cap and verdict cache of the current process.
+    Also used as the pool initializer, so each worker opens its own cache connection.
+    """
+    global verdict_cache, exact_sentiment, max_text_bytes
+    load_indicators(indicators)
+    exact_sentiment = exact
+    max_text_bytes = max_text
+    verdict_cache = VerdictCache(cache_size, cache_path)
+
+# Sentiment lexicon as (sorted word forms, mean polarity, mean intensity, whether the word can be an
+# adverb, digest of the lexicon file); loaded on first use
+_lexicon = None
+# Use TextBlob's full analyzer instead of the lexicon lookup; set by init_classifier()
+exact_sentiment = False
+
+def load_lexicon():
+    """
+    Load TextBlob's pattern sentiment lexicon into sorted NumPy arrays, along with a digest of the file.
+    Scores are averaged per part of speech and then across them, as TextBlob does.
+    The XML file is read directly, so TextBlob itself is never imported.
+    Returns None when NumPy or the lexicon is unavailable.
+    """
+    global _lexicon
+    if _lexicon is None:
+        try:
+            import numpy as np
+            spec = importlib.util.find_spec('textblob')
+            path = os.path.join(os.path.dirname(spec.origin), 'en', 'en-sentiment.xml')
+            with open(path, 'rb') as f:
+                source = f.read()
+            senses = {}  # form -> part of speech -> [(polarity, intensity)]
+            for word in ElementTree.fromstring(source).iter('word'):
+                if word.get('form'):
+                    senses.setdefault(word.get('form').lower(), {}).setdefault(word.get('pos'), []).append(
+                        (float(word.get('polarity', 0)), float(word.get('intensity', 1))))
+            by_pos = {form: {pos: np.mean(scores, axis=0) for pos, scores in pos_senses.items()}
+                      for form, pos_senses in senses.items()}
+            overall = {form: np.mean(list(pos_scores.values()), axis=0) for form, pos_scores in by_pos.items()}
+            # TextBlob adds an adverb for every adjective, scored like it: terrible -> terribly, real -> really
+            for form, pos_scores in list(by_pos.items()):
+                if 'JJ' in pos_scores:
+                    stem = form[:-1] + 'i' if form.endswith('y') else form
+                    adverb = (stem[:-2] if stem.endswith('le') else stem) + 'ly'
+                    by_pos.setdefault(adverb, {})['RB'] = overall[adverb] = pos_scores['JJ']
+            forms = sorted(by_pos)
+            scores = np.array([overall[form] for form in forms])
+            _lexicon = (np.array(forms), scores[:, 0], scores[:, 1], np.array(['RB' in by_pos[form] for form in forms]),
+                        hashlib.sha256(source).hexdigest()[:16])
+        except (ImportError, AttributeError, OSError, ValueError, ElementTree.ParseError):
+            _lexicon = False
+    return _lexicon or None
+
+def sentiment_scorer():
+    """Name the scorer score_polarity() will use, so verdicts from different scorers are cached apart."""
+    lexicon = None if exact_sentiment else load_lexicon()
+    # The version changes whenever the lookup scores differently, so older cached verdicts are not reused
+    return f"lexicon-2:{lexicon[4]}" if lexicon is not None else "textblob"
+
+def score_polarity(texts):
+    """
+    Return the polarity of each text, scoring the whole batch with one vectorized lexicon lookup
+    (the mean polarity of the lexicon words it contains, adverbs applied to the word after them).
+    Falls back to TextBlob, imported on
+    first use, when exact scoring is requested or the lexicon can't be loaded.
+    """
+    lexicon = None if exact_sentiment else load_lexicon()
+    if lexicon is None:
+        from textblob import TextBlob
+        return [TextBlob(text).sentiment.polarity for text in texts]
+
+    import numpy as np
+    forms, polarities, intensities, adverbs, _ = lexicon
+    longest = forms.dtype.itemsize // 4  # Longer tokens can't be in the lexicon
+    tokens = []
+    lengths = []
+    for text in texts:
+        words = [word for word in WORD.findall(text.lower()) if len(word) <= longest]
+        tokens.extend(words)
+        lengths.append(len(words))
+    if not tokens:
+        return [0.0] * len(texts)
+    tokens = np.array(tokens, dtype=forms.dtype)
+    positions = np.searchsorted(forms, tokens).clip(max=len(forms) - 1)
+    known = forms[positions] == tokens
+    # Don't carry negations and adverbs over from the previous text
+    starts = np.zeros(len(tokens), dtype=bool)
+    starts[np.cumsum(lengths)[:-1] % len(tokens)] = True
+    negated = np.zeros(len(tokens), dtype=bool)
+    negated[1:] = np.isin(tokens[:-1], NEGATIONS) | np.char.endswith(tokens[:-1], "n't")
+    negated[starts] = False
+    # An adverb followed by a lexicon word merges into it: "very bad" is bad scaled by very's intensity,
+    # and "not very good" is good scaled down by it, then negated
+    adverb = known & adverbs[positions]
+    modified = np.zeros(len(tokens), dtype=bool)
+    modified[1:] = adverb[:-1] & known[1:]
+    modified[starts] = False
+    absorbed = np.zeros(len(tokens), dtype=bool)
+    absorbed[:-1] = modified[1:]
+    scale = np.ones(len(tokens))
+    scale[1:] = intensities[positions[:-1]]
+    negated_adverb = np.zeros(len(tokens), dtype=bool)
+    negated_adverb[1:] = negated[:-1]
+    scale = np.where(negated_adverb, 1 / scale, scale)
+    weights = np.where(modified, np.clip(polarities[positions] * scale, -1.0, 1.0), polarities[positions])
+    exclaimed = np.zeros(len(tokens), dtype=bool)
+    exclaimed[:-1] = (tokens[1:] == '!') & ~starts[1:]
+    weights = np.clip(np.where(exclaimed, weights * 1.25, weights), -1.0, 1.0)
+    weights *= np.where(negated | (modified & negated_adverb), -0.5, 1.0)
+    known &= ~absorbed
+    documents = np.repeat(np.arange(len(texts)), lengths)[known]
+    sums = np.bincount(documents, weights=weights[known], minlength=len(texts))
+    counts = np.bincount(documents, minlength=len(texts))
+    return (sums / np.maximum(counts, 1)).tolist()
+
+def check_phishing_batch(texts):
+    """
+    Analyze many email bodies at once and return the reasons each one was flagged.
+    Indicator hits short-circuit, so only bodies without one are scored for sentiment.
+    If scoring fails, those bodies get the exception instead of reasons, so it is never taken for a clean verdict.
+    """
+    results = [indicator_matcher.find(text) for text in texts]
+    unresolved = [i for i, reasons in enumerate(results) if not reasons]
+    if unresolved:
+        try:
+            for i, polarity in zip(unresolved, score_polarity([texts[i] for i in unresolved])):
+                if polarity < 0:
+                    results[i].append("negative sentiment")
+        except Exception as e:
+            for i in unresolved:
+                results[i] = e
+    return results
+
 def check_phishing(email_content):
     """
     Analyze email content for phishing indicators.
-    Works with any Unicode text.
+    Works with any Unicode text. Returns the reasons the content was flagged
+    (matched indicators, or negative sentiment when nothing matched); an empty list means clean.
+    Raises the error if the sentiment can't be scored.
+    """
+    reasons = check_phishing_batch([email_content])[0]
+    if isinstance(reasons, Exception):
+        raise reasons
+    return reasons
+
+# Most body text handed to check_phishing() per message; set by init_classifier()
+max_text_bytes = 65536
+
+class TextOnlyMessage(Message):
+    """
+    Message class for the feed parser that keeps headers and text bodies but drops the
+    payload of attachments and other non-text parts as soon as they are parsed, undecoded.
+    """
+
+    def set_payload(self, payload, charset=None):
+        if (self.get_content_maintype() not in ('text', 'multipart', 'message')
+                or self.get_content_disposition() == 'attachment'):
+            payload = ''
+        super().set_payload(payload, charset)
+
+def parse_message(raw_email):
+    """Parse a raw message by feeding it to a BytesFeedParser in chunks."""
+    parser = BytesFeedParser(_factory=TextOnlyMessage)
+    for offset in range(0, len(raw_email), FEED_CHUNK):
+        parser.feed(raw_email[offset:offset + FEED_CHUNK])
+    return parser.close()
+
+def decode_payload(payload, charset=None):
+    """Decode a body payload with its declared charset or UTF-8, falling back to latin1."""
+    try:
+        return payload.decode(charset or 'utf-8', errors='ignore')
+    except (LookupError, UnicodeDecodeError):
+        return payload.decode('latin1', errors='ignore')
+
+def decode_part(part, max_bytes):
+    """
+    Decode roughly the first max_bytes of a part's body. The encoded text is trimmed
+    before decoding, so a huge part costs no more than a small one.
+    """
+    payload = part.get_payload()
+    if not isinstance(payload, str):
+        return ""
+    encoding = part.get('Content-Transfer-Encoding', '').strip().lower()
+    try:
+        if encoding == 'base64':
+            # 4 encoded characters per 3 bytes, plus line breaks
+            data = ''.join(payload[:max_bytes * 2].split())
+            body = binascii.a2b_base64(data[:len(data) // 4 * 4])
+        elif encoding == 'quoted-printable':
+            body = quopri.decodestring(payload[:max_bytes * 3].encode('ascii', 'surrogateescape'))
+        else:
+            body = payload[:max_bytes].encode('ascii', 'surrogateescape')
+    except (binascii.Error, ValueError):
+        return ""
+    return decode_payload(body[:max_bytes], part.get_content_charset())
+
+def strip_html(markup):
+    """Reduce an HTML body to its visible text, with whitespace (including &nbsp;) collapsed."""
+    return ' '.join(html.unescape(HTML_TAG.sub(' ', HTML_SKIP.sub(' ', markup))).split())
+
+def extract_text(msg, max_bytes=None):
+    """
+    Return up to max_bytes of body text: the first non-empty text/plain part,
+    otherwise the first text/html part with its markup stripped.
+    """
+    max_bytes = max_bytes or max_text_bytes
+    html_part = None
+    for part in msg.walk():
+        if part.is_multipart() or part.get_content_disposition() == 'attachment':
+            continue
+        content_type = part.get_content_type()
+        if content_type == 'text/html' and html_part is None:
+            html_part = part
+        elif content_type == 'text/plain' or not msg.is_multipart():
+            text = decode_part(part, max_bytes)
+            if text.strip():
+                return text
+    if html_part is not None:
+        return strip_html(decode_part(html_part, max_bytes))[:max_bytes]
+    return ""
+
+def classify_batch(raw_emails):
+    """
+    Parse and classify a batch of raw messages; this is the worker entry point.
+    Returns one (subject, reasons, cached, error) tuple per message and never raises; cached is
+    True for a cache hit, False for a message that was classified and None when neither happened.
+    """
+    results = []
+    unscored = {}  # key -> (email_content, indices of messages with that body)
+    for raw_email in raw_emails:
+        try:
+            msg = parse_message(raw_email)
+            subject = msg.get('Subject', 'No Subject')
+            email_content = extract_text(msg)
+            if not email_content:
+                results.append((subject, [], None, None))
+                continue
+            key = verdict_cache.key(email_content)
+            reasons = verdict_cache.get(key)
+            if reasons is not None:
+                results.append((subject, reasons, True, None))
+                continue
+            if key in unscored:
+                # Same body earlier in this batch: it will share that message's verdict
+                unscored[key][1].append(len(results))
+                results.append((subject, None, True, None))
+                continue
+            unscored[key] = (email_content, [len(results)])
+            results.append((subject, None, False, None))
+        except Exception as e:
+            results.append((None, [], None, e))
+
+    try:
+        verdicts = check_phishing_batch([email_content for email_content, _ in unscored.values()])
+    except Exception as e:
+        verdicts = [e] * len(unscored)
+    for (key, (_, indices)), reasons in zip(unscored.items(), verdicts):
+        if isinstance(reasons, Exception):
+            for index in indices:
+                results[index] = (results[index][0], [], None, reasons)
+            continue
+        verdict_cache.put(key, reasons)
+        for index in indices:
+            subject, _, cached, _ = results[index]
+            results[index] = (subject, list(reasons), cached, None)
+    return results
+
+def chunked(messages, size):
+    """Group (label, raw_email) pairs into lists of at most size items."""
+    chunk = []
+    for message in messages:
+        chunk.append(message)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def classify_stream(messages, pool=None, queue_size=1000):
+    """
+    Classify (label, raw_email) pairs and yield (label, (subject, reasons, cached, error)) in input order.
+    Messages are classified in chunks so sentiment is scored a batch at a time. With a process pool,
+    the workers classify while the caller's generator keeps fetching; at most queue_size messages
+    are in flight at once.
+    """
+    if pool is None:
+        for chunk in chunked(messages, CLASSIFY_CHUNK):
+            yield from zip([label for label, _ in chunk], classify_batch([raw for _, raw in chunk]))
+        return
+    pending = deque()
+    max_pending = max(1, queue_size // CLASSIFY_CHUNK)
+    for chunk in chunked(messages, CLASSIFY_CHUNK):
+        if len(pending) >= max_pending:
+            labels, future = pending.popleft()
+            yield from zip(labels, future.result())
+        pending.append(([label for label, _ in chunk], pool.submit(classify_batch, [raw for _, raw in chunk])))
+    while pending:
+        labels, future = pending.popleft()
+        yield from zip(labels, future.result())
+
+def search_uids(mail, criteria='ALL'):
+    """Return the sorted UIDs in the selected folder matching the search criteria."""
+    _, data = mail.uid('search', None, criteria)
+    if not data or not data[0]:
+        return []
+    return sorted(int(uid) for uid in data[0].split())
+
+def uid_set(uids):
+    """Collapse sorted UIDs into a compact IMAP sequence set such as '1:5,7,9:12'."""
+    ranges = []
+    start = prev = uids[0]
+    for uid in uids[1:]:
+        if uid != prev + 1:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = uid
+        prev = uid
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ','.join(ranges)
+
+def parse_fetch_response(data):
+    """Group a UID FETCH response into (uid, raw_email) pairs."""
+    messages = []
+    current = None
+    for item in data:
+        if item is None:
+            continue
+        prefix, literal = item if isinstance(item, tuple) else (item, None)
+        if FETCH_START.match(prefix):
+            current = {'uid': None}
+            messages.append(current)
+        if current is None:
+            continue
+        uid = FETCH_UID.search(prefix)
+        if uid:
+            current['uid'] = int(uid.group(1))
+        section = FETCH_SECTION.search(prefix)
+        if section and literal is not None:
+            current[section.group(1)] = literal
+    return [(m['uid'], m.get(b'HEADER', b'') + m.get(b'TEXT', b''))
+            for m in messages if m['uid'] is not None]
+
+def fetch_messages(mail, uids, batch_size=500, max_bytes=65536):
+    """
+    Fetch messages in UID batches and yield (uid, raw_email) as each batch arrives.
+    Only headers and the first max_bytes of the body text are downloaded.
+    Stops at the first batch the server refuses, so the checkpoint never moves past it;
+    a dropped connection (IMAP4.abort) is raised to the caller.
+    """
+    items = FETCH_ITEMS.format(max_bytes=max_bytes)
+    for i in range(0, len(uids), batch_size):
+        batch = uids[i:i + batch_size]
+        try:
+            typ, data = mail.uid('fetch', uid_set(batch), items)
+        except imaplib.IMAP4.abort:
+            raise
+        except imaplib.IMAP4.error as e:
+            typ, data = 'NO', e
+        if typ != 'OK':
+            print(f"Fetch failed for UIDs {batch[0]}-{batch[-1]}: {data}; "
+                  f"stopping so UIDs from {batch[0]} on are retried next run")
+            return
+        for uid, raw_email in parse_fetch_response(data):
+            yield uid, raw_email
+
+def scan_folder(mail, account, folder, store, uidvalidity, batch_size=500, max_bytes=65536, pool=None,
+                queue_size=1000):
+    """
+    Classify the messages in the selected folder that are newer than the stored checkpoint.
+    uidvalidity is the folder's UIDVALIDITY, as returned by select_folder().
+    Returns (number scanned, [(uid, subject, reasons) for each flagged message]).
     """
+    last_uid = store.last_uid(account, folder, uidvalidity)
+    # 'n:*' always matches the newest message, so drop anything already scanned
+    uids = [uid for uid in search_uids(mail, f'UID {last_uid + 1}:*') if uid > last_uid]
+    if not uids:
+        print(f"No new emails in {folder}.")
+        return 0, []
+
+    results = []
+    flagged = []
+    scanned = cache_hits = cache_misses = 0
+    messages = fetch_messages(mail, uids, batch_size, max_bytes)
     try:
-        blob = TextBlob(email_content)
-        # Check for negative sentiment or phishing keywords
-        if (blob.sentiment.polarity < 0 or 
-            any(keyword in email_content.lower() for keyword in ["urgent", "click here", "verify now"])):
-            return True
+        # Verdicts arrive in UID order, so whatever was saved is a contiguous prefix of the folder
+        for uid, (subject, reasons, cached, error) in classify_stream(messages, pool, queue_size):
+            scanned += 1
+            if error is not None:
+                print(f"Error processing email UID {uid}: {error}")
+                continue
+            if cached is not None:
+                cache_hits += cached
+                cache_misses += not cached
+            if reasons:
+                print(f"Potential phishing email: {subject} ({', '.join(reasons)}) [{account}/{folder}]")
+                flagged.append((uid, subject, reasons))
+            results.append((uid, subject, bool(reasons)))
+            if len(results) >= batch_size:
+                store.save(account, folder, uidvalidity, results)
+                results = []
+    finally:
+        store.save(account, folder, uidvalidity, results)
+    print(f"Verdict cache: {cache_hits} hits, {cache_misses} misses in {account}/{folder}.")
+    return scanned, flagged
+
+def iter_mbox(path):
+    """
+    Yield (label, raw_email) for each message in an mbox file.
+    The file is memory-mapped and split on 'From ' separator lines, so only the
+    message being handed off is ever copied out of the page cache.
+    """
+    with open(path, 'rb') as mbox:
+        if os.fstat(mbox.fileno()).st_size == 0:
+            return
+        with mmap.mmap(mbox.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:5] == b'From ':
+                start = 0
+            else:
+                start = mm.find(b'\nFrom ') + 1
+                if not start:
+                    return  # No separator line, so not an mbox
+            index = 0
+            while start < len(mm):
+                separator = mm.find(b'\nFrom ', start)
+                end = separator + 1 if separator != -1 else len(mm)
+                body_start = mm.find(b'\n', start, end) + 1 or end
+                index += 1
+                yield f"{os.path.basename(path)}#{index}", mm[body_start:end]
+                start = end
+
+def iter_maildir(path):
+    """Yield (label, raw_email) for each message in the new/ and cur/ folders of a Maildir."""
+    for subdir in ('new', 'cur'):
+        folder = os.path.join(path, subdir)
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            if entry.is_file() and not entry.name.startswith('.'):
+                with open(entry.path, 'rb') as message:
+                    yield f"{subdir}/{entry.name}", message.read()
+
+def scan_archive(path, pool=None, queue_size=1000):
+    """
+    Classify every message in an mbox file or Maildir directory without an IMAP server.
+    Returns the number of messages scanned.
+    """
+    messages = iter_maildir(path) if os.path.isdir(path) else iter_mbox(path)
+    scanned = cache_hits = cache_misses = 0
+    for label, (subject, reasons, cached, error) in classify_stream(messages, pool, queue_size):
+        scanned += 1
+        if error is not None:
+            print(f"Error processing email {label}: {error}")
+            continue
+        if cached is not None:
+            cache_hits += cached
+            cache_misses += not cached
+        if reasons:
+            print(f"Potential phishing email: {subject} ({', '.join(reasons)}) [{label}]")
+    print(f"Verdict cache: {cache_hits} hits, {cache_misses} misses in {path}.")
+    return scanned
+
+def connect(server, username, password):
+    """Open an IMAP session to the server and log in."""
+    mail = imaplib.IMAP4_SSL(server)
+    mail._encoding = 'utf-8'  # Force UTF-8 encoding for IMAP commands
+    mail.login(username, password)
+    return mail
+
+def select_folder(mail, folder):
+    """
+    Select a folder read-only so nothing is marked as seen, and return its UIDVALIDITY from the
+    SELECT response (RFC 3501 advises against STATUS on the selected mailbox).
+    """
+    typ, data = mail.select(folder, readonly=True)
+    if typ != 'OK':
+        raise imaplib.IMAP4.error(data[0].decode('utf-8', errors='replace') if data and data[0] else typ)
+    _, data = mail.response('UIDVALIDITY')
+    if not data or data[-1] is None:
+        raise imaplib.IMAP4.error(f"No UIDVALIDITY reported for {folder}")
+    return int(data[-1])
+
+def response_waiting(mail):
+    """
+    Return whether a response line can be read without waiting on the socket: imaplib's buffered
+    reader or the SSL layer may already hold bytes that select() can't see.
+    """
+    timeout = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+def idle_wait(mail, timeout=IDLE_TIMEOUT):
+    """
+    Hold the connection in IMAP IDLE until the server reports new mail or the timeout expires.
+    Returns True if an EXISTS notification arrived.
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b' IDLE\r\n')
+    response = mail.readline()
+    if not response.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"Server refused IDLE: {response.decode('utf-8', errors='replace').strip()}")
+
+    has_new = False
+    deadline = time.monotonic() + timeout
+    while not has_new:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not response_waiting(mail) and not select.select([mail.sock], [], [], remaining)[0]:
+            break
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed during IDLE")
+        has_new = line.rstrip().endswith(b'EXISTS')
+
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed while leaving IDLE")
+        # Mail may arrive between our DONE and the server's tagged reply
+        has_new |= line.rstrip().endswith(b'EXISTS')
+        if line.startswith(tag):
+            if not line.startswith(tag + b' OK'):
+                raise imaplib.IMAP4.error(f"IDLE failed: {line.decode('utf-8', errors='replace').strip()}")
+            return has_new
+
+def watch_folder(mail, server, username, password, folder, store, uidvalidity, idle_timeout=IDLE_TIMEOUT,
+                 **scan_options):
+    """
+    Keep the selected folder, whose UIDVALIDITY is given, under IDLE and classify new messages as
+    soon as the server announces them.
+    Dropped connections are re-established with exponential backoff. Runs until Ctrl+C.
+    """
+    delay = 1
+    try:
+        while True:
+            try:
+                if mail is None:
+                    mail = connect(server, username, password)
+                    uidvalidity = select_folder(mail, folder)
+                    print(f"Reconnected to {server}.")
+                    # Catch up on anything delivered while we were disconnected
+                    scan_folder(mail, username, folder, store, uidvalidity, **scan_options)
+                    delay = 1
+                if idle_wait(mail, idle_timeout):
+                    scan_folder(mail, username, folder, store, uidvalidity, **scan_options)
+            except (imaplib.IMAP4.abort, OSError) as e:
+                print(f"Connection lost ({e}); reconnecting in {delay}s.")
+                if mail is not None:
+                    try:
+                        mail.shutdown()
+                    except Exception:
+                        pass
+                mail = None
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+        if mail is not None:
+            mail.shutdown()
+
+class ConnectionPool:
+    """
+    Logged-in IMAP sessions shared by concurrent scan tasks, capped per server.
+    A session is handed back to the next task for the same account; when a server is at
+    its limit, idle sessions of other accounts are closed to make room for waiting tasks.
+    """
+
+    def __init__(self, limits, default_limit):
+        self.limits = limits
+        self.default_limit = default_limit
+        self.slots = {}
+        self.waiting = {}
+        self.idle = {}
+
+    def _slots(self, server):
+        if server not in self.slots:
+            self.slots[server] = asyncio.Semaphore(self.limits.get(server, self.default_limit))
+            self.waiting[server] = 0
+        return self.slots[server]
+
+    def _take_idle(self, server):
+        """Remove and return any idle session on the server, or None."""
+        for (idle_server, _), sessions in self.idle.items():
+            if idle_server == server and sessions:
+                return sessions.pop()
+        return None
+
+    async def acquire(self, account):
+        server = account['server']
+        sessions = self.idle.get((server, account['username']))
+        if sessions:
+            return sessions.pop()
+        slots = self._slots(server)
+        victim = self._take_idle(server) if slots.locked() else None
+        if victim is not None:
+            # The closed session's slot passes straight to this task
+            await asyncio.to_thread(close_session, victim)
+        else:
+            self.waiting[server] += 1
+            try:
+                await slots.acquire()
+            finally:
+                self.waiting[server] -= 1
+        try:
+            return await asyncio.to_thread(connect, server, account['username'], account['password'])
+        except BaseException:
+            slots.release()
+            raise
+
+    async def release(self, account, mail, reusable=True):
+        server = account['server']
+        if reusable and not self.waiting[server]:
+            self.idle.setdefault((server, account['username']), []).append(mail)
+            return
+        await asyncio.to_thread(close_session, mail)
+        self.slots[server].release()
+
+    async def close(self):
+        for sessions in self.idle.values():
+            while sessions:
+                await asyncio.to_thread(close_session, sessions.pop())
+
+def close_session(mail):
+    """Log out, ignoring errors from sessions that are already gone."""
+    try:
+        mail.logout()
+    except Exception:
+        pass
+
+def load_accounts(path):
+    """
+    Read a multi-account config file, e.g.
+    {"max_connections": {"imap.gmail.com": 10},
+     "accounts": [{"username": "a@example.com", "password": "...", "server": "imap.gmail.com",
+                   "folders": ["inbox", "spam"]}]}
+    """
+    with open(path, encoding='utf-8') as config_file:
+        config = json.load(config_file)
+    for account in config['accounts']:
+        account.setdefault('server', 'imap.gmail.com')
+        account.setdefault('folders', ['inbox'])
+    config.setdefault('max_connections', {})
+    return config
+
+def scan_selected(mail, username, folder, state_path, full, scan_options):
+    """Select a folder on a pooled session and scan it with a checkpoint connection of its own."""
+    uidvalidity = select_folder(mail, folder)
+    store = CheckpointStore(state_path)
+    try:
+        if full:
+            store.reset(username, folder)
+        return scan_folder(mail, username, folder, store, uidvalidity, **scan_options)
+    finally:
+        store.close()
+
+async def scan_mailbox(pool, account, folder, state_path, full, scan_options):
+    """Scan one account folder on a pooled connection and return its report entry."""
+    report = {'account': account['username'], 'folder': folder, 'scanned': 0, 'flagged': [], 'error': None}
+    try:
+        mail = await pool.acquire(account)
+    except Exception as e:
+        report['error'] = f"Connection failed: {e}"
+        return report
+    reusable = True
+    try:
+        report['scanned'], report['flagged'] = await asyncio.to_thread(
+            scan_selected, mail, account['username'], folder, state_path, full, scan_options)
+    except (imaplib.IMAP4.abort, OSError) as e:
+        reusable = False
+        report['error'] = str(e)
     except Exception as e:
-        print(f"Error analyzing content: {e}")
-    return False
+        report['error'] = str(e)
+    finally:
+        await pool.release(account, mail, reusable)
+    return report
+
+async def scan_accounts(config, state_path, full=False, default_limit=4, **scan_options):
+    """
+    Scan every configured account and folder concurrently, bounded per server by the connection pool.
+    Returns one report entry per account folder.
+    """
+    pool = ConnectionPool(config['max_connections'], default_limit)
+    servers = {account['server'] for account in config['accounts']}
+    # Blocking imaplib calls run in threads; size the executor to the total connection budget
+    threads = sum(config['max_connections'].get(server, default_limit) for server in servers)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(threads, 1)))
+    try:
+        return await asyncio.gather(*(
+            scan_mailbox(pool, account, folder, state_path, full, scan_options)
+            for account in config['accounts'] for folder in account['folders']))
+    finally:
+        await pool.close()
+
+def print_report(reports):
+    """Print the combined multi-account report."""
+    print("\n=== Scan report ===")
+    for report in reports:
+        if report['error']:
+            print(f"{report['account']}/{report['folder']}: failed ({report['error']})")
+            continue
+        print(f"{report['account']}/{report['folder']}: {report['scanned']} scanned, "
+              f"{len(report['flagged'])} flagged")
+        for uid, subject, reasons in report['flagged']:
+            print(f"  UID {uid}: {subject} ({', '.join(reasons)})")
+    print(f"Total: {sum(r['scanned'] for r in reports)} scanned, "
+          f"{sum(len(r['flagged']) for r in reports)} flagged, "
+          f"{sum(1 for r in reports if r['error'])} folders failed.")
+
+def start_classifier(args):
+    """Set up classification in-process, or return a worker pool when more than one worker is requested."""
+    classifier_options = (args.indicators, args.cache_size, args.cache, args.exact_sentiment, args.max_text)
+    if args.workers <= 1:
+        init_classifier(*classifier_options)
+        return None
+    # Workers load the feed and open the cache themselves (also works with the spawn start method)
+    return ProcessPoolExecutor(max_workers=args.workers, initializer=init_classifier,
+                               initargs=classifier_options)
 
 def main():
+    parser = argparse.ArgumentParser(description="IMAP phishing scanner")
+    parser.add_argument('-s', '--server', default='imap.gmail.com', help="IMAP server (default: Gmail)")
+    parser.add_argument('-f', '--folder', default='inbox', help="Folder to scan")
+    parser.add_argument('-b', '--batch_size', type=int, default=500, help="UIDs fetched per request")
+    parser.add_argument('-m', '--max_bytes', type=int, default=65536, help="Body bytes fetched per message")
+    parser.add_argument('--state', default='phishing_scan.db', help="Checkpoint database for incremental scans")
+    parser.add_argument('--full', action='store_true', help="Ignore the checkpoint and rescan the whole folder")
+    parser.add_argument('--watch', action='store_true', help="Keep running and scan new mail via IMAP IDLE")
+    parser.add_argument('--idle_timeout', type=int, default=IDLE_TIMEOUT, help="Seconds before IDLE is re-issued")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help="Classifier processes (1 classifies in the fetching process)")
+    parser.add_argument('--queue_size', type=int, default=1000, help="Messages in flight to the classifiers")
+    parser.add_argument('-i', '--indicators', help="Indicator feed file (one phrase, domain or URL per line)")
+    parser.add_argument('--cache', help="Shared on-disk verdict cache (SQLite file)")
+    parser.add_argument('--cache_size', type=int, default=10000, help="Verdicts kept in memory per process")
+    parser.add_argument('-a', '--archive', help="Scan an mbox file or Maildir directory instead of an IMAP folder")
+    parser.add_argument('-c', '--config', help="JSON file of accounts and folders to scan concurrently")
+    parser.add_argument('--max_connections', type=int, default=4,
+                        help="Connections per server when the config sets no limit")
+    parser.add_argument('--report', help="Write the multi-account report to this JSON file")
+    parser.add_argument('--exact_sentiment', action='store_true',
+                        help="Score sentiment with TextBlob instead of the faster lexicon lookup")
+    parser.add_argument('--max_text', type=int, default=65536, help="Body text bytes analyzed per message")
+    args = parser.parse_args()
+
+    try:
+        # Fail fast on a bad feed before prompting for credentials
+        load_indicators(args.indicators)
+    except OSError as e:
+        print(f"Failed to load indicators from {args.indicators}: {e}")
+        return
+
+    # Offline mode: scan an exported mailbox instead of a server
+    if args.archive:
+        pool = start_classifier(args)
+        try:
+            scanned = scan_archive(args.archive, pool, args.queue_size)
+            print(f"Scanned {scanned} emails in {args.archive}.")
+        except (OSError, ValueError) as e:
+            print(f"Failed to read {args.archive}: {e}")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        return
+
+    # Multi-account mode: credentials and folders come from the config file
+    if args.config:
+        try:
+            config = load_accounts(args.config)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Failed to load accounts from {args.config}: {e}")
+            return
+        pool = start_classifier(args)
+        try:
+            reports = asyncio.run(scan_accounts(config, args.state, args.full, args.max_connections,
+                                                batch_size=args.batch_size, max_bytes=args.max_bytes,
+                                                pool=pool, queue_size=args.queue_size))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        print_report(reports)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as report_file:
+                json.dump(reports, report_file, indent=2)
+        return
+
     # Get email and password from user (supports any characters)
     username = input("Enter your email address: ").strip()
     password = input("Enter your password (or app password): ").strip()
 
     # Connect to IMAP server with UTF-8 support
     try:
-        mail = imaplib.IMAP4_SSL('imap.gmail.com')  # Default to Gmail; modify if needed
+        mail = imaplib.IMAP4_SSL(args.server)
         mail._encoding = 'utf-8'  # Force UTF-8 encoding for IMAP commands
     except Exception as e:
         print(f"Failed to connect to IMAP server: {e}")
@@ -46,61 +1058,34 @@ def main():
         print(f"Unexpected login error: {e}")
         return
 
-    # Select inbox (or modify to another folder)
+    # Select the folder read-only so nothing is marked as seen
     try:
-        mail.select('inbox')
+        uidvalidity = select_folder(mail, args.folder)
     except imaplib.IMAP4.error as e:
-        print(f"Failed to select inbox: {e}")
+        print(f"Failed to select {args.folder}: {e}")
         return
 
-    # Search all emails
+    # Classify only what arrived since the last run
+    store = CheckpointStore(args.state)
+    pool = start_classifier(args)
+    scan_options = dict(batch_size=args.batch_size, max_bytes=args.max_bytes,
+                        pool=pool, queue_size=args.queue_size)
     try:
-        _, data = mail.search(None, 'ALL')
-        if not data[0]:  # Check if inbox is empty
-            print("No emails found in inbox.")
-            mail.close()
-            mail.logout()
+        if args.full:
+            store.reset(username, args.folder)
+        scanned, _ = scan_folder(mail, username, args.folder, store, uidvalidity, **scan_options)
+        print(f"Scanned {scanned} new emails in {args.folder}.")
+        if args.watch:
+            print(f"Watching {args.folder} for new mail (Ctrl+C to stop)...")
+            watch_folder(mail, args.server, username, password, args.folder, store, uidvalidity,
+                         args.idle_timeout, **scan_options)
             return
     except Exception as e:
-        print(f"Error searching emails: {e}")
-        return
-
-    # Process each email
-    for num in data[0].split():
-        try:
-            _, msg_data = mail.fetch(num, '(RFC822)')
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
-
-            # Handle email payload (body) with flexible decoding
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == 'text/plain':
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            # Decode with UTF-8, fall back to latin1 if needed
-                            try:
-                                email_content = payload.decode('utf-8', errors='ignore')
-                            except UnicodeDecodeError:
-                                email_content = payload.decode('latin1', errors='ignore')
-                            if check_phishing(email_content):
-                                subject = msg.get('Subject', 'No Subject')
-                                print(f"Potential phishing email: {subject}")
-                            break
-            else:
-                payload = msg.get_payload(decode=True)
-                if payload:
-                    try:
-                        email_content = payload.decode('utf-8', errors='ignore')
-                    except UnicodeDecodeError:
-                        email_content = payload.decode('latin1', errors='ignore')
-                    if check_phishing(email_content):
-                        subject = msg.get('Subject', 'No Subject')
-                        print(f"Potential phishing email: {subject}")
-
-        except Exception as e:
-            print(f"Error processing email #{num}: {e}")
-            continue
+        print(f"Error scanning {args.folder}: {e}")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        store.close()
 
     # Clean up
     try:
@@ -1,9 +1,24 @@
 import argparse
+from collections import Counter, namedtuple
+import csv
+from functools import partial
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.firefox.service import Service
 from selenium.webdriver.firefox.options import Options
-from urllib.parse import urljoin, urlparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+import hashlib
+import json
+import math
+import queue
+import sqlite3
+import threading
 import time
 import re
 import logging
@@ -12,76 +27,604 @@ import logging
 logging.basicConfig(filename='idor_detection.log', level=logging.INFO, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-def login(driver, login_url, username, password, username_field, password_field, submit_button):
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'yclid'}
+
+# Path and query values that identify an object rather than an endpoint
+NUMERIC_ID = re.compile(r'^\d+$')
+UUID_ID = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+# Numbers and long hex runs (timestamps, CSRF tokens, request IDs) that change between
+# requests for the same content; they are masked before fingerprinting
+VOLATILE = re.compile(r'\b[0-9a-f]{16,}\b|\d+')
+WORD = re.compile(r'\w+')
+
+# One round trip per page: every link and form target (already absolute), plus the markup
+# and visible text when the page is to be fingerprinted
+SNAPSHOT_SCRIPT = """
+const [capture] = arguments;
+const links = Array.from(document.querySelectorAll('a[href]'), a => a.href);
+const forms = Array.from(document.forms, form => form.action).filter(Boolean);
+if (!capture) {
+    return {links: links.concat(forms), source: null, text: null};
+}
+return {links: links.concat(forms), source: document.documentElement.outerHTML,
+        text: document.body ? document.body.innerText : ''};
+"""
+
+# Compact summary of a response: simhash of its normalized text with the users' identifiers masked,
+# log-scale length bucket, the user patterns found in it and how many identifiers were masked.
+# Pages are reduced to this as soon as they are loaded.
+Fingerprint = namedtuple('Fingerprint', 'simhash size matches mentions')
+
+# A loaded page; fingerprint is None unless patterns were given to the loader
+Page = namedtuple('Page', 'links timing fingerprint')
+
+# Outcome of a User B check; distance is the simhash distance to User A's response
+Verdict = namedtuple('Verdict', 'idor matches distance')
+
+def create_driver():
+    """Start a headless Firefox instance."""
+    firefox_options = Options()
+    firefox_options.headless = True
+    firefox_options.add_argument("--no-sandbox")
+    service = Service(executable_path="/usr/local/bin/geckodriver")
+    return webdriver.Firefox(service=service, options=firefox_options)
+
+class NavigationTimer:
+    """Thread-safe timing records for every navigation: load, readiness wait and pattern match."""
+
+    PHASES = ('load', 'wait', 'match')
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+
+    def record(self, url, load=0.0, wait=0.0, match=0.0):
+        with self.lock:
+            self.records.append({'url': url, 'load': load, 'wait': wait, 'match': match})
+
+    def summary(self):
+        """Return {phase: {count, total, mean, p50, p95, max}} over all records, in seconds."""
+        with self.lock:
+            records = list(self.records)
+        summary = {}
+        for phase in self.PHASES:
+            values = sorted(record[phase] for record in records)
+            if not values:
+                continue
+            summary[phase] = {
+                'count': len(values),
+                'total': sum(values),
+                'mean': sum(values) / len(values),
+                'p50': values[len(values) // 2],
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max': values[-1],
+            }
+        return summary
+
+    def export(self, path):
+        """Write every record as CSV, or records plus summary as JSON, depending on the extension."""
+        with self.lock:
+            records = list(self.records)
+        with open(path, 'w', newline='', encoding='utf-8') as output:
+            if path.endswith('.csv'):
+                writer = csv.DictWriter(output, fieldnames=('url',) + self.PHASES)
+                writer.writeheader()
+                writer.writerows(records)
+            else:
+                json.dump({'summary': self.summary(), 'records': records}, output, indent=2)
+
+def wait_ready(driver, timeout=10, selector=None):
+    """
+    Wait until the document has finished loading and, if given, the CSS selector is present.
+    Returns False (after logging a warning) if the page isn't ready within the timeout.
+    """
+    def ready(d):
+        if d.execute_script("return document.readyState") != 'complete':
+            return False
+        return not selector or bool(d.find_elements(By.CSS_SELECTOR, selector))
+    try:
+        WebDriverWait(driver, timeout).until(ready)
+        return True
+    except TimeoutException:
+        logging.warning(f"Page not ready after {timeout}s: {driver.current_url}")
+        return False
+
+def timed_get(driver, url, timeout=10, selector=None, timer=None):
+    """Navigate to a URL, wait for readiness and record the load and wait times."""
+    start = time.perf_counter()
+    driver.get(url)
+    loaded = time.perf_counter()
+    wait_ready(driver, timeout, selector)
+    ready = time.perf_counter()
+    if timer is not None:
+        timer.record(url, load=loaded - start, wait=ready - loaded)
+    return loaded - start, ready - loaded
+
+def login(driver, login_url, username, password, username_field, password_field, submit_button,
+          timeout=10, selector=None, timer=None):
     """Log in to the website with provided credentials."""
     try:
-        driver.get(login_url)
+        timed_get(driver, login_url, timeout, timer=timer)
         driver.find_element(By.NAME, username_field).send_keys(username)
         driver.find_element(By.NAME, password_field).send_keys(password)
-        driver.find_element(By.NAME, submit_button).click()
-        time.sleep(2)  # Wait for login to complete
+        submit = driver.find_element(By.NAME, submit_button)
+        # Compare with where the browser landed, which may differ from login_url after a redirect
+        form_url = driver.current_url
+        start = time.perf_counter()
+        submit.click()
+        # Login is complete once the form page is replaced (or the URL changes) and the next page is ready
+        WebDriverWait(driver, timeout).until(EC.any_of(EC.staleness_of(submit), EC.url_changes(form_url)))
+        wait_ready(driver, timeout, selector)
+        if timer is not None:
+            timer.record(driver.current_url, wait=time.perf_counter() - start)
         logging.info(f"Successfully logged in as {username}")
         return True
     except Exception as e:
         logging.error(f"Login failed for {username}: {e}")
         return False
 
-def logout(driver, logout_url):
+def logout(driver, logout_url, timeout=10, timer=None):
     """Log out from the website."""
     try:
-        driver.get(logout_url)
-        time.sleep(1)
+        timed_get(driver, logout_url, timeout, timer=timer)
         logging.info("Successfully logged out")
     except Exception as e:
         logging.error(f"Logout failed: {e}")
 
-def crawl(driver, start_url, max_depth, visited, params_collected, pattern):
-    """Crawl the website and collect URLs with parameters where pattern is present."""
-    if max_depth <= 0 or start_url in visited:
+def extract_params(url):
+    """Return the query string and ID-like path of a URL, or None if it has neither."""
+    parsed = urlparse(url)
+    url_params = {}
+    if parsed.query:
+        url_params['query'] = parsed.query
+    if re.search(r'\d+', parsed.path):  # Heuristic: digits in path might indicate an ID
+        url_params['path'] = parsed.path
+    return url_params or None
+
+class LinkParser(HTMLParser):
+    """
+    Collect the href of every <a> tag and the action of every <form> in an HTML document,
+    along with its visible text (everything outside <script> and <style>).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.hrefs = []
+        self.text = []
+        self.hidden = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self.hidden += 1
+        target = dict(attrs).get({'a': 'href', 'form': 'action'}.get(tag, ''))
+        if target:
+            self.hrefs.append(target)
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style') and self.hidden:
+            self.hidden -= 1
+
+    def handle_data(self, data):
+        if not self.hidden:
+            self.text.append(data)
+
+class PatternSet:
+    """
+    The user patterns, each compiled on its own so inline flags, backreferences and overlapping
+    matches behave exactly as they would for that pattern alone. Raises re.error for an invalid pattern.
+    identities are the users' names, masked along with the patterns before a page is fingerprinted.
+    """
+
+    def __init__(self, patterns, identities=()):
+        self.patterns = list(patterns)
+        self.regexes = [re.compile(pattern) for pattern in self.patterns]
+        self.masks = self.regexes + [re.compile(re.escape(identity), re.IGNORECASE) for identity in identities if identity]
+
+    def search(self, text):
+        """Return the patterns that occur in text."""
+        return frozenset(pattern for pattern, regex in zip(self.patterns, self.regexes) if regex.search(text))
+
+    def mask(self, text):
+        """Replace every pattern match and identity in text with one placeholder; returns (text, count)."""
+        mentions = 0
+        for regex in self.masks:
+            text, count = regex.subn(' _ ', text)
+            mentions += count
+        return text, mentions
+
+def simhash(tokens, bits=64):
+    """Simhash of the word 3-shingles in tokens; near-identical texts differ in only a few bits."""
+    shingles = Counter(' '.join(tokens[i:i + 3]) for i in range(max(len(tokens) - 2, 1)))
+    weights = [0] * bits
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=bits // 8).digest(), 'little')
+        for bit in range(bits):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+def page_fingerprint(source, text, patterns):
+    """
+    Reduce a page to a Fingerprint: the patterns are matched against its markup, the rest uses its
+    text with the users' identifiers masked, so "Signed in as alice" and "Signed in as bob" agree.
+    """
+    masked, mentions = patterns.mask(text)
+    tokens = WORD.findall(VOLATILE.sub('0', masked.lower()))
+    return Fingerprint(simhash(tokens), int(math.log2(len(masked) + 1) * 4), patterns.search(source), mentions)
+
+def compare_fingerprints(reference, fingerprint, max_distance=3):
+    """
+    Return (similar, distance): whether fingerprint is the same response as reference, allowing
+    max_distance differing simhash bits and a neighbouring length bucket.
+    """
+    if reference is None:
+        return False, None
+    distance = bin(reference.simhash ^ fingerprint.simhash).count('1')
+    return distance <= max_distance and abs(reference.size - fingerprint.size) <= 1, distance
+
+def browser_page(driver, url, timeout=10, selector=None, patterns=None):
+    """
+    Load a page in the browser and snapshot its links, and its markup and text when patterns are
+    given, with a single script call. The content is only kept long enough to fingerprint it.
+    """
+    load, wait = timed_get(driver, url, timeout, selector)
+    start = time.perf_counter()
+    snapshot = driver.execute_script(SNAPSHOT_SCRIPT, patterns is not None)
+    fingerprint = None
+    if patterns is not None:
+        fingerprint = page_fingerprint(snapshot['source'], snapshot['text'], patterns)
+    timing = {'load': load, 'wait': wait, 'match': time.perf_counter() - start}
+    return Page(snapshot['links'], timing, fingerprint)
+
+def http_session(driver, pool_size):
+    """Build a pooled HTTP session carrying the browser's cookies and user agent."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = driver.execute_script("return navigator.userAgent")
+    for cookie in driver.get_cookies():
+        # Host-only cookies are left without a domain; we only ever request the target site
+        domain = cookie.get('domain', '')
+        session.cookies.set(cookie['name'], cookie['value'], path=cookie.get('path', '/'),
+                            domain=domain if domain.startswith('.') else '')
+    return session
+
+def http_page(session, url, timeout=10, selector=None, js_pattern=None, driver=None, driver_lock=None,
+              patterns=None):
+    """
+    Fetch a page over plain HTTP and return it as a Page.
+    URLs matching js_pattern are rendered in the shared browser instead.
+    """
+    if js_pattern is not None and js_pattern.search(url):
+        with driver_lock:
+            return browser_page(driver, url, timeout, selector, patterns)
+    start = time.perf_counter()
+    response = session.get(url, timeout=timeout)
+    timing = {'load': time.perf_counter() - start, 'wait': 0.0}
+    start = time.perf_counter()
+    links, text = [], response.text
+    if 'html' in response.headers.get('Content-Type', 'text/html'):
+        parser = LinkParser()
+        parser.feed(response.text)
+        links = [urljoin(response.url, href) for href in parser.hrefs]
+        text = ' '.join(parser.text)
+    fingerprint = page_fingerprint(response.text, text, patterns) if patterns is not None else None
+    timing['match'] = time.perf_counter() - start
+    return Page(links, timing, fingerprint)
+
+def page_loaders(drivers, count, http=False, js_pattern=None, timeout=10, selector=None):
+    """
+    Return the page loaders for a crawl or check run: one per browser, or, in HTTP mode,
+    count loaders sharing a pooled session built from the first browser's cookies.
+    """
+    if not http:
+        return [partial(browser_page, driver, timeout=timeout, selector=selector) for driver in drivers]
+    session = http_session(drivers[0], count)
+    load = partial(http_page, session, timeout=timeout, selector=selector, js_pattern=js_pattern,
+                   driver=drivers[0], driver_lock=threading.Lock())
+    return [load] * count
+
+def normalize_url(url):
+    """Lower-case scheme and host, drop the fragment and tracking parameters, and sort the query."""
+    parsed = urlparse(url)
+    query = sorted((key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_'))
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path or '/',
+                       parsed.params, urlencode(query), ''))
+
+def template_value(value):
+    """Replace an ID-like value with a placeholder."""
+    if NUMERIC_ID.match(value):
+        return '{int}'
+    if UUID_ID.match(value):
+        return '{uuid}'
+    return value
+
+def url_template(url):
+    """Map a normalized URL to its endpoint template, e.g. /orders/17?page=3 -> /orders/{int}?page={int}."""
+    parsed = urlparse(url)
+    path = '/'.join(template_value(segment) for segment in parsed.path.split('/'))
+    query = '&'.join(f"{key}={template_value(value)}" for key, value in parse_qsl(parsed.query, keep_blank_values=True))
+    return f"{parsed.netloc}{path}?{query}"
+
+class BloomFilter:
+    """Fixed-size set membership with a bounded false-positive rate and no false negatives."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one digest generate all k positions
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+class VisitedIndex:
+    """
+    Crawl admission by endpoint rather than exact URL: URLs are normalized, remembered in a
+    Bloom filter, and only samples_per_template URLs are admitted for each URL template.
+    Not thread-safe; callers hold the crawl lock.
+    """
+
+    def __init__(self, samples_per_template=3, capacity=1000000, error_rate=0.001):
+        self.samples_per_template = samples_per_template
+        self.seen = BloomFilter(capacity, error_rate)
+        self.templates = {}
+        self.count = 0
+
+    def admit(self, url):
+        """Return the normalized URL if it should be crawled, otherwise None."""
+        normalized = normalize_url(url)
+        if normalized in self.seen:
+            return None
+        self.seen.add(normalized)
+        template = url_template(normalized)
+        sampled = self.templates.get(template, 0)
+        if sampled >= self.samples_per_template:
+            return None
+        self.templates[template] = sampled + 1
+        self.count += 1
+        return normalized
+
+class CrawlStore:
+    """
+    SQLite checkpoint of a crawl: the frontier with done flags, collected parameters and IDOR
+    verdicts. Writes are buffered and committed in batches (every batch_size changes or
+    interval seconds), so a crash loses at most the last few seconds of work.
+    """
+
+    def __init__(self, path, batch_size=200, interval=5.0):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS frontier (url TEXT PRIMARY KEY, depth INTEGER, done INTEGER DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS params (url TEXT PRIMARY KEY, params TEXT, fingerprint TEXT);
+            CREATE TABLE IF NOT EXISTS verdicts (url TEXT PRIMARY KEY, idor INTEGER, checked_at REAL);
+        """)
+        self.lock = threading.Lock()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.last_flush = time.monotonic()
+        self.pending = {'frontier': [], 'done': [], 'params': [], 'verdicts': []}
+
+    def reset(self):
+        """Discard any previous crawl state."""
+        with self.lock, self.conn:
+            for table in ('frontier', 'params', 'verdicts'):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    def load(self):
+        """
+        Return ([(url, depth, done)] in crawl order, {url: params}, {url: User A fingerprint},
+        {url: idor}) from the last run.
+        """
+        with self.lock:
+            urls = self.conn.execute("SELECT url, depth, done FROM frontier ORDER BY rowid").fetchall()
+            params, references = {}, {}
+            for url, value, reference in self.conn.execute("SELECT url, params, fingerprint FROM params"):
+                params[url] = json.loads(value)
+                if reference:
+                    simhash_value, size, matches, mentions = json.loads(reference)
+                    references[url] = Fingerprint(simhash_value, size, frozenset(matches), mentions)
+            verdicts = {url: bool(idor) for url, idor in self.conn.execute("SELECT url, idor FROM verdicts")}
+        return urls, params, references, verdicts
+
+    def add_url(self, url, depth):
+        self._queue('frontier', (url, depth))
+
+    def mark_done(self, url):
+        self._queue('done', (url,))
+
+    def add_params(self, url, url_params, fingerprint=None):
+        reference = json.dumps([fingerprint.simhash, fingerprint.size, sorted(fingerprint.matches),
+                                fingerprint.mentions]) if fingerprint else None
+        self._queue('params', (url, json.dumps(url_params), reference))
+
+    def add_verdict(self, url, idor):
+        self._queue('verdicts', (url, int(idor), time.time()))
+
+    def _queue(self, kind, row):
+        with self.lock:
+            self.pending[kind].append(row)
+            if (sum(len(rows) for rows in self.pending.values()) >= self.batch_size
+                    or time.monotonic() - self.last_flush >= self.interval):
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO frontier (url, depth) VALUES (?, ?)",
+                                  self.pending['frontier'])
+            self.conn.executemany("UPDATE frontier SET done = 1 WHERE url = ?", self.pending['done'])
+            self.conn.executemany("INSERT OR REPLACE INTO params VALUES (?, ?, ?)", self.pending['params'])
+            self.conn.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?)", self.pending['verdicts'])
+        for rows in self.pending.values():
+            rows.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+def crawl_page(load, url, patterns, timer=None):
+    """
+    Load a page and return (url_params if a pattern is present, User A's fingerprint, same-site links).
+    Only URLs with parameters are fingerprinted; other pages just contribute their links.
+    """
+    url_params = extract_params(url)
+    page = load(url, patterns=patterns if url_params else None)
+    if timer is not None:
+        timer.record(url, **page.timing)
+
+    # Check if a pattern (e.g., User A's data) is in the response
+    if page.fingerprint is None or not page.fingerprint.matches:
+        url_params = None
+
+    netloc = urlparse(url).netloc
+    return url_params, page.fingerprint, [link for link in page.links if urlparse(link).netloc == netloc]
+
+def crawl_worker(load, frontier, visited, params_collected, patterns, lock, timer=None, candidates=None,
+                 store=None):
+    """Take (url, depth) items off the frontier until a None sentinel arrives."""
+    while True:
+        item = frontier.get()
+        if item is None:
+            frontier.task_done()
+            return
+        url, depth = item
+        try:
+            url_params, fingerprint, links = crawl_page(load, url, patterns, timer)
+            with lock:
+                if url_params:
+                    params_collected[url] = url_params
+                    if store is not None:
+                        store.add_params(url, url_params, fingerprint)
+                    if candidates is not None:
+                        candidates.put((url, fingerprint))  # Hand off to the User B checker right away
+                if depth > 1:
+                    for link in links:
+                        normalized = visited.admit(link)
+                        if normalized:
+                            frontier.put((normalized, depth - 1))
+                            if store is not None:
+                                store.add_url(normalized, depth - 1)
+                if store is not None:
+                    store.mark_done(url)
+        except Exception as e:
+            logging.error(f"Error crawling {url}: {e}")
+        finally:
+            frontier.task_done()
+
+def crawl(loaders, start_url, max_depth, visited, params_collected, patterns, timer=None, candidates=None,
+          store=None, resume_from=None):
+    """
+    Crawl the website breadth-first and collect URLs with parameters where a pattern is present.
+    Each page loader (a browser or an HTTP worker) works the shared frontier from its own thread.
+    visited is a VisitedIndex, so the crawl grows with distinct endpoints rather than object IDs.
+    Collected URLs are also put on the candidates queue, if one is given, as soon as they are found,
+    together with the fingerprint of User A's response.
+    Progress is checkpointed to store, if given; resume_from lists the (url, depth) items still
+    pending from a previous run and replaces the start URL.
+    """
+    if resume_from is None:
+        start_url = visited.admit(start_url) if max_depth > 0 else None
+        if not start_url:
+            return
+        resume_from = [(start_url, max_depth)]
+        if store is not None:
+            store.add_url(start_url, max_depth)
+    if not resume_from:
         return
-    visited.add(start_url)
-    try:
-        driver.get(start_url)
-        time.sleep(1)  # Wait for page to load
-        page_source = driver.page_source
-
-        # Check if the pattern (e.g., User A's data) is in the response
-        if re.search(pattern, page_source):
-            parsed = urlparse(start_url)
-            query_params = parsed.query
-            path = parsed.path
-
-            # Store URL if it has parameters
-            url_params = {}
-            if query_params:
-                url_params['query'] = query_params
-            if re.search(r'\d+', path):  # Heuristic: digits in path might indicate an ID
-                url_params['path'] = path
-            if url_params:
-                params_collected[start_url] = url_params
-
-        # Find all links to crawl further
-        links = driver.find_elements(By.TAG_NAME, 'a')
-        for link in links:
-            href = link.get_attribute('href')
-            if href and urlparse(href).netloc == urlparse(start_url).netloc:
-                absolute_url = urljoin(start_url, href)
-                crawl(driver, absolute_url, max_depth - 1, visited, params_collected, pattern)
-    except Exception as e:
-        logging.error(f"Error crawling {start_url}: {e}")
+    lock = threading.Lock()
+    frontier = queue.Queue()
+    for item in resume_from:
+        frontier.put(item)
+
+    workers = [threading.Thread(target=crawl_worker,
+                                args=(load, frontier, visited, params_collected, patterns, lock, timer, candidates, store),
+                                daemon=True)
+               for load in loaders]
+    for worker in workers:
+        worker.start()
+    frontier.join()
+    for _ in workers:
+        frontier.put(None)
+    for worker in workers:
+        worker.join()
 
-def check_idor(driver, url, pattern):
-    """Check if the URL reveals User A's data when accessed by User B."""
+def check_idor(load, url, patterns, reference=None, max_distance=3, timer=None):
+    """
+    Check if the URL reveals User A's data when accessed by User B: either one of the patterns is
+    in the response, or the response is near-identical to User A's (reference) fingerprint while
+    mentioning the users less often. A page that only differs in whose name it shows, such as a
+    public page with a "Signed in as" banner, mentions each user equally and is not a leak.
+    """
     try:
-        driver.get(url)
-        time.sleep(1)
-        if re.search(pattern, driver.page_source):
-            logging.info(f"Potential IDOR detected at: {url}")
-            return True
-        return False
+        page = load(url, patterns=patterns)
+        if timer is not None:
+            timer.record(url, **page.timing)
+        similar, distance = compare_fingerprints(reference, page.fingerprint, max_distance)
+        similar = similar and reference.mentions > page.fingerprint.mentions
+        verdict = Verdict(bool(page.fingerprint.matches) or similar, sorted(page.fingerprint.matches), distance)
+        if verdict.idor:
+            logging.info(f"Potential IDOR detected at: {url} (patterns {verdict.matches}, distance {distance})")
+        return verdict
     except Exception as e:
         logging.error(f"Error checking {url} for IDOR: {e}")
-        return False
+        return Verdict(False, [], None)
+
+def load_results(path):
+    """Return the URLs already verified in a JSON-lines results file, so a rerun can skip them."""
+    checked = set()
+    try:
+        with open(path, encoding='utf-8') as results:
+            for line in results:
+                if line.strip():
+                    checked.add(json.loads(line)['url'])
+    except FileNotFoundError:
+        pass
+    return checked
+
+def idor_checker(load, candidates, patterns, checked, lock, results=None, timer=None, findings=None, store=None,
+                 max_distance=3):
+    """
+    Verify (url, User A fingerprint) candidates as User B while the User A crawl is still running.
+    Each verdict is reported and appended to the results file immediately; stops at a None sentinel.
+    """
+    while True:
+        item = candidates.get()
+        if item is None:
+            return
+        url, reference = item
+        with lock:
+            if url in checked:
+                continue
+            checked.add(url)
+        verdict = check_idor(load, url, patterns, reference, max_distance, timer)
+        if store is not None:
+            store.add_verdict(url, verdict.idor)
+        with lock:
+            if verdict.idor:
+                print(f"Potential IDOR found: {url}")
+                if findings is not None:
+                    findings.append(url)
+            if results is not None:
+                results.write(json.dumps({'url': url, 'idor': verdict.idor, 'matches': verdict.matches,
+                                          'distance': verdict.distance, 'checked_at': time.time()}) + '\n')
+                results.flush()
 
 def main():
     # Parse command-line arguments
@@ -97,52 +640,129 @@ def main():
     parser.add_argument('-s', '--submit_button', default='submit', help="Submit button name in login form")
     parser.add_argument('-o', '--logout_url', required=True, help="Logout URL")
     parser.add_argument('-m', '--max_depth', type=int, default=3, help="Maximum crawl depth")
-    parser.add_argument('-t', '--pattern', required=True, help="Pattern to identify User A's data (e.g., username)")
+    parser.add_argument('-t', '--pattern', required=True, action='append',
+                        help="Pattern to identify User A's data (e.g., username); repeat for several")
+    parser.add_argument('--max_distance', type=int, default=3,
+                        help="Simhash bits by which User B's response may differ from User A's and still count as a leak")
+    parser.add_argument('-n', '--workers', type=int, default=4, help="Number of browsers crawling in parallel")
+    parser.add_argument('--http', action='store_true',
+                        help="Crawl and check over plain HTTP with the browser's session cookies")
+    parser.add_argument('-j', '--js_pattern', help="Regex of URLs that need a browser to render (HTTP mode)")
+    parser.add_argument('--timeout', type=int, default=10,
+                        help="Seconds to wait for an HTTP response or for a page to become ready")
+    parser.add_argument('-r', '--ready_selector', help="CSS selector that marks a page as ready (browser mode)")
+    parser.add_argument('--samples_per_template', type=int, default=3,
+                        help="URLs crawled per URL template (e.g. /orders/{int})")
+    parser.add_argument('--max_urls', type=int, default=1000000, help="Expected distinct URLs, sizes the visited filter")
+    parser.add_argument('--results', help="Append IDOR verdicts to this JSON-lines file; "
+                                          "URLs already in it are skipped, so interrupted scans can resume")
+    parser.add_argument('--state', default='idor_crawl.db',
+                        help="SQLite file checkpointing the frontier, parameters and verdicts")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the crawl saved in --state instead of starting over")
+    parser.add_argument('--timings', help="Export per-navigation timings to this .json or .csv file")
     args = parser.parse_args()
+    workers = max(args.workers, 1)
+    try:
+        js_pattern = re.compile(args.js_pattern) if args.js_pattern else None
+        patterns = PatternSet(args.pattern, [args.user_a, args.user_b])
+    except re.error as e:
+        parser.error(f"invalid regular expression {e.pattern!r}: {e}")
 
-    # Set up Firefox in headless mode
-    firefox_options = Options()
-    firefox_options.headless = True
-    firefox_options.add_argument("--no-sandbox")
-    service = Service(executable_path="/usr/local/bin/geckodriver")
-    driver = webdriver.Firefox(service=service, options=firefox_options)
+    # Set up headless Firefox: a pool of crawlers (or a single browser for logins in HTTP mode)
+    # for User A, and a separate browser kept logged in as User B for the checks
+    drivers_a = [create_driver() for _ in range(1 if args.http else workers)]
+    driver_b = create_driver()
+    drivers = drivers_a + [driver_b]
+    timer = NavigationTimer()
+    results = None
+    store = None
 
     try:
-        # Step 1: Log in as User A and crawl
-        if not login(driver, args.login_url, args.user_a, args.pass_a, 
-                     args.username_field, args.password_field, args.submit_button):
-            print("Login failed for User A. Exiting.")
+        # Step 1: Log in both users side by side
+        for crawler in drivers_a:
+            if not login(crawler, args.login_url, args.user_a, args.pass_a,
+                         args.username_field, args.password_field, args.submit_button,
+                         args.timeout, args.ready_selector, timer):
+                print("Login failed for User A. Exiting.")
+                return
+        if not login(driver_b, args.login_url, args.user_b, args.pass_b,
+                     args.username_field, args.password_field, args.submit_button,
+                     args.timeout, args.ready_selector, timer):
+            print("Login failed for User B. Exiting.")
             return
 
-        visited = set()
+        # Step 2: Start the User B checkers; they verify each candidate as soon as the crawl finds it
+        checked = load_results(args.results) if args.results else set()
+        if checked:
+            logging.info(f"Resuming: {len(checked)} URLs already verified in {args.results}")
+        if args.results:
+            results = open(args.results, 'a', encoding='utf-8')
+        candidates = queue.Queue()
+        store = CrawlStore(args.state)
+        visited = VisitedIndex(args.samples_per_template, args.max_urls)
         params_collected = {}
-        logging.info(f"Starting crawl as {args.user_a} from {args.url}")
-        crawl(driver, args.url, args.max_depth, visited, params_collected, args.pattern)
-        logging.info(f"Collected {len(params_collected)} URLs with parameters for User A")
-
-        # Step 2: Log out User A
-        logout(driver, args.logout_url)
+        resume_from = None
+        if args.resume:
+            urls, params_collected, references, verdicts = store.load()
+            if urls:
+                for url, _, _ in urls:
+                    visited.admit(url)  # Replay admissions to rebuild the Bloom filter and template counts
+                resume_from = [(url, depth) for url, depth, done in urls if not done]
+                checked |= set(verdicts)
+                for url in params_collected:
+                    if url not in checked:
+                        candidates.put((url, references.get(url)))
+                logging.info(f"Resuming from {args.state}: {len(resume_from)} of {len(urls)} URLs pending, "
+                             f"{len(verdicts)} verdicts recorded")
+        else:
+            store.reset()
+        lock = threading.Lock()
+        findings = []
+        checkers = [threading.Thread(target=idor_checker,
+                                     args=(load, candidates, patterns, checked, lock,
+                                           results, timer, findings, store, args.max_distance),
+                                     daemon=True)
+                    for load in page_loaders([driver_b], workers, args.http, js_pattern,
+                                             args.timeout, args.ready_selector)]
+        for checker in checkers:
+            checker.start()
+        print("Checking for IDOR vulnerabilities...")
 
-        # Step 3: Log in as User B
-        if not login(driver, args.login_url, args.user_b, args.pass_b, 
-                     args.username_field, args.password_field, args.submit_button):
-            print("Login failed for User B. Exiting.")
-            return
+        # Step 3: Crawl as User A, streaming candidates to the checkers
+        loaders = page_loaders(drivers_a, workers, args.http, js_pattern, args.timeout, args.ready_selector)
+        logging.info(f"Starting crawl as {args.user_a} from {args.url} with {len(loaders)} workers")
+        crawl(loaders, args.url, args.max_depth, visited, params_collected, patterns, timer, candidates,
+              store, resume_from)
+        logging.info(f"Crawled {visited.count} URLs across {len(visited.templates)} URL templates; "
+                     f"collected {len(params_collected)} URLs with parameters for User A")
 
-        # Step 4: Test for IDOR as User B
-        print("Checking for IDOR vulnerabilities...")
-        for url in params_collected:
-            if check_idor(driver, url, args.pattern):
-                print(f"Potential IDOR found: {url}")
+        # Step 4: Let the checkers drain the queue
+        for _ in checkers:
+            candidates.put(None)
+        for checker in checkers:
+            checker.join()
+        logging.info(f"IDOR checks complete: {len(findings)} potential IDORs")
 
-        # Step 5: Log out User B
-        logout(driver, args.logout_url)
+        # Step 5: Log out both users
+        for crawler in drivers:
+            logout(crawler, args.logout_url, args.timeout, timer)
 
     except Exception as e:
         logging.error(f"Script execution failed: {e}")
         print(f"An error occurred: {e}")
     finally:
-        driver.quit()
+        for crawler in drivers:
+            crawler.quit()
+        if results is not None:
+            results.close()
+        if store is not None:
+            store.close()
+        for phase, stats in timer.summary().items():
+            logging.info(f"Timing {phase}: {stats['count']} navigations, mean {stats['mean']:.3f}s, "
+                         f"p95 {stats['p95']:.3f}s, max {stats['max']:.3f}s, total {stats['total']:.1f}s")
+        if args.timings:
+            timer.export(args.timings)
         logging.info("Script execution completed")
 
 if __name__ == "__main__":
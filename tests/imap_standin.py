@@ -0,0 +1,159 @@
+"""
+Stand-ins for an imaplib session: an in-memory one for searching and fetching, a socket-backed one
+for IDLE, and a server that counts the logged-in sessions a connection pool holds open.
+"""
+import imaplib
+import re
+import socket
+import threading
+
+
+def make_message(subject, body):
+    return f"Subject: {subject}\r\nContent-Type: text/plain\r\n\r\n{body}".encode()
+
+
+class FakeIMAP:
+    """
+    Serves messages {uid: raw_email} the way imaplib returns them, truncating the body text to the
+    requested partial range. failures maps the index of a UID FETCH call (0 for the first) to an
+    exception to raise or to a status such as 'NO' to return. With uid_last, the UID is reported
+    after the header literal, as some servers do.
+    """
+
+    def __init__(self, messages, uidvalidity=1, failures=None, uid_last=False):
+        self.messages = dict(messages)
+        self.uidvalidity = uidvalidity
+        self.failures = dict(failures or {})
+        self.uid_last = uid_last
+        self.fetches = []
+        self.items = []
+        self.untagged = {}
+
+    def select(self, folder, readonly=False):
+        self.untagged = {'UIDVALIDITY': [str(self.uidvalidity).encode()]}
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        # Like imaplib, hand over the untagged response once
+        return code, self.untagged.pop(code, [None])
+
+    def uid(self, command, *args):
+        if command == 'search':
+            return 'OK', [b' '.join(str(uid).encode() for uid in self._search(args[-1]))]
+        if command == 'fetch':
+            return self._fetch(*args)
+        raise imaplib.IMAP4.error(f"unsupported command {command}")
+
+    def _search(self, criteria):
+        uids = sorted(self.messages)
+        match = re.match(r'UID (\d+):\*', criteria)
+        if not match:
+            return uids
+        # Like a real server, 'n:*' always includes the highest UID
+        return [uid for uid in uids if uid >= int(match.group(1))] or uids[-1:]
+
+    def _fetch(self, uid_set, items):
+        call = len(self.fetches)
+        wanted = set()
+        for part in uid_set.split(','):
+            start, _, end = part.partition(':')
+            wanted.update(range(int(start), int(end or start) + 1))
+        self.fetches.append(sorted(wanted))
+        self.items.append(items)
+        partial = re.search(r'BODY\.PEEK\[TEXT\]<0\.(\d+)>', items)
+        failure = self.failures.get(call)
+        if isinstance(failure, Exception):
+            raise failure
+        if failure is not None:
+            return failure, [b'fetch refused']
+        data = []
+        for sequence, uid in enumerate(sorted(self.messages), 1):
+            if uid not in wanted:
+                continue
+            header, _, text = self.messages[uid].partition(b'\r\n\r\n')
+            header += b'\r\n\r\n'
+            if partial:
+                text = text[:int(partial.group(1))]
+            if self.uid_last:
+                data.append((f'{sequence} (BODY[HEADER] {{{len(header)}}}'.encode(), header))
+                data.append((f' UID {uid} BODY[TEXT]<0> {{{len(text)}}}'.encode(), text))
+            else:
+                data.append((f'{sequence} (UID {uid} BODY[HEADER] {{{len(header)}}}'.encode(), header))
+                data.append((f' BODY[TEXT]<0> {{{len(text)}}}'.encode(), text))
+            data.append(b')')
+        return 'OK', data
+
+
+class IdleSession:
+    """
+    The parts of an imaplib session idle_wait() uses, over a socket pair. The server side sends
+    greeting as soon as IDLE is issued and done_reply once the client sends DONE.
+    """
+
+    def __init__(self, greeting, done_reply):
+        self.sock, self.server = socket.socketpair()
+        self.file = self.sock.makefile('rb')
+        self.done_reply = done_reply
+        self.greeting = greeting
+        self.replier = threading.Thread(target=self._reply_to_done, daemon=True)
+
+    def _new_tag(self):
+        return b'A1'
+
+    def send(self, data):
+        self.sock.sendall(data)
+        if data.endswith(b' IDLE\r\n'):
+            self.server.sendall(self.greeting)
+            self.replier.start()
+
+    def readline(self):
+        return self.file.readline()
+
+    def _reply_to_done(self):
+        received = b''
+        while not received.endswith(b'DONE\r\n'):
+            received += self.server.recv(1024)
+        self.server.sendall(self.done_reply)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+        self.server.close()
+
+
+class LoginCounter:
+    """
+    Replaces connect() with sessions that only log in and out, recording the most sessions open
+    at once on each server and every session a task used after it was logged out.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = {}
+        self.peak = {}
+        self.logins = 0
+        self.stale = []
+
+    def connect(self, server, username, password):
+        with self.lock:
+            self.open[server] = self.open.get(server, 0) + 1
+            self.peak[server] = max(self.peak.get(server, 0), self.open[server])
+            self.logins += 1
+        return PooledSession(self, server, username)
+
+
+class PooledSession:
+    def __init__(self, counter, server, username):
+        self.counter = counter
+        self.server = server
+        self.username = username
+        self.closed = False
+
+    def use(self, username):
+        if self.closed or username != self.username:
+            self.counter.stale.append((self.username, username))
+
+    def logout(self):
+        with self.counter.lock:
+            self.counter.open[self.server] -= 1
+        self.closed = True
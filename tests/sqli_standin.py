@@ -0,0 +1,160 @@
+"""A login endpoint served over HTTP for the SQL injection scanner, in a safe, an error-based and a time-based flavour."""
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urljoin
+
+import requests
+from selenium.common.exceptions import ElementNotInteractableException
+
+# Seconds a time-based injection stalls the response
+DELAY = 0.4
+
+SLEEP_MARKERS = ('SLEEP(', 'WAITFOR DELAY', 'PG_SLEEP(')
+
+LOGIN_PAGE = ('<html><body><form action="/login/{kind}" method="post"><input name="user" type="text">'
+              '<input name="pw" type="password"><input name="csrf" type="hidden" value="token-1">'
+              '<input name="go" type="submit" value="Log in"></form></body></html>')
+
+
+class LoginHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.respond(LOGIN_PAGE.format(kind=self.path.strip('/')))
+
+    def do_POST(self):
+        kind = self.path.rsplit('/', 1)[-1]
+        length = int(self.headers.get('Content-Length', 0))
+        fields = parse_qsl(self.rfile.read(length).decode(), keep_blank_values=True)
+        with self.server.lock:
+            self.server.submissions.append((kind, fields))
+        user = dict(fields).get('user', '')
+        if kind == 'time' and any(marker in user.upper() for marker in SLEEP_MARKERS):
+            time.sleep(DELAY)
+        if kind == 'error' and "'" in user:
+            body = "You have an error in your SQL syntax; check the manual near ''' at line 1"
+        else:
+            body = "Invalid username or password"
+        self.respond(f'<html><body><p>{body}</p></body></html>')
+
+    def respond(self, page):
+        data = page.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(threaded=True):
+    """
+    Start the app on a free port; returns the server, whose submissions list logs (kind, fields).
+    Unthreaded, it handles one request at a time like a single-worker backend.
+    """
+    server = (ThreadingHTTPServer if threaded else HTTPServer)(('127.0.0.1', 0), LoginHandler)
+    server.submissions = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def login_form(scanner, server, kind):
+    """The FormSpec a snapshot of the login page for kind would produce."""
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    fields = [('user', 'text', ''), ('pw', 'password', ''), ('csrf', 'hidden', 'token-1'), ('go', 'submit', 'Log in')]
+    return scanner.FormSpec(f'{base}/{kind}', ('xpath', '(//form)[1]'), f'{base}/login/{kind}', 'post', fields)
+
+
+class Input:
+    def __init__(self, form, attributes):
+        self.form = form
+        self.attributes = attributes
+        self.value = attributes.get('value') or ''
+
+    def get_attribute(self, name):
+        return self.value if name == 'value' else self.attributes.get(name)
+
+    def clear(self):
+        if self.attributes.get('type') == 'hidden':
+            raise ElementNotInteractableException("element not interactable")
+        self.value = ''
+
+    def send_keys(self, keys):
+        self.clear()
+        self.value += keys
+
+    def click(self):
+        self.form.submit()
+
+
+class Form:
+    def __init__(self, browser, attributes):
+        self.browser = browser
+        self.attributes = attributes
+        self.inputs = []
+
+    def find_elements(self, by, value):
+        return list(self.inputs)
+
+    def find_element(self, by, value):
+        return next(input for input in self.inputs if input.attributes.get('type') == 'submit')
+
+    def submit(self):
+        data = [(input.attributes['name'], input.value) for input in self.inputs if input.attributes.get('name')]
+        action = urljoin(self.browser.current_url, self.attributes.get('action', ''))
+        self.browser.load(self.browser.session.post(action, data=data))
+
+
+class FormParser(HTMLParser):
+    def __init__(self, browser):
+        super().__init__()
+        self.browser = browser
+        self.forms = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'form':
+            self.forms.append(Form(self.browser, dict(attrs)))
+        elif tag == 'input' and self.forms:
+            self.forms[-1].inputs.append(Input(self.forms[-1], dict(attrs)))
+
+
+class BrowserStandin:
+    """A browser over requests for the pages above: forms found by position, typed into and submitted."""
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.history = []
+        self.current_url = None
+        self.page_source = ''
+        self.forms = []
+
+    def load(self, response):
+        self.history.append((self.current_url, self.page_source))
+        self.show(response.url, response.text)
+
+    def show(self, url, source):
+        self.current_url, self.page_source = url, source
+        parser = FormParser(self)
+        parser.feed(source)
+        self.forms = parser.forms
+
+    def get(self, url):
+        self.load(self.session.get(url))
+
+    def back(self):
+        self.show(*self.history.pop())
+
+    def find_element(self, by, value):
+        if value == 'body':
+            return True
+        return self.forms[int(re.fullmatch(r'\(//form\)\[(\d+)\]', value).group(1)) - 1]
+
+    def execute_script(self, script, *args):
+        if script == "arguments[0].value = arguments[1];":
+            args[0].value = args[1]
+            return None
+        raise NotImplementedError(script)
@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import StaleElementReferenceException
+
+import hodor
+import web_standin
+
+
+def test_pattern_set_keeps_inline_flags():
+    assert hodor.PatternSet(['(?i)alice', 'bob']).search("Hello ALICE") == {'(?i)alice'}
+
+
+def test_pattern_set_keeps_numbered_backreferences():
+    patterns = hodor.PatternSet(['zz', r'(\d)\1'])
+    assert patterns.search("id 44") == {r'(\d)\1'}
+    assert patterns.search("id 45") == frozenset()
+
+
+def test_pattern_set_reports_overlapping_patterns():
+    patterns = hodor.PatternSet(['alice', 'alice@ex'])
+    assert patterns.search("mail alice@example.com") == {'alice', 'alice@ex'}
+
+
+def test_invalid_pattern_is_a_usage_error(monkeypatch, capsys):
+    monkeypatch.setattr('sys.argv', ['hodor.py', '-u', 'http://x/', '-l', 'http://x/login', '-a', 'a', '-p', 'p',
+                                     '-b', 'b', '-q', 'q', '-o', 'http://x/logout', '-t', 'alice', '-t', '(bob'])
+    monkeypatch.setattr(hodor, 'create_driver', lambda: pytest.fail("browser started for an invalid pattern"))
+    with pytest.raises(SystemExit) as exit_info:
+        hodor.main()
+    assert exit_info.value.code == 2
+    assert "invalid regular expression '(bob'" in capsys.readouterr().err
+
+
+@pytest.fixture
+def shop():
+    server = web_standin.serve()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_crawl_and_idor_check(shop):
+    base = f'http://127.0.0.1:{shop.server_address[1]}'
+    patterns = hodor.PatternSet(['alice'], ['alice', 'bob'])
+    loaders = hodor.page_loaders([web_standin.CookieDriver('A')], 3, http=True)
+    params_collected = {}
+    candidates = queue.Queue()
+    hodor.crawl(loaders, base + '/', 3, hodor.VisitedIndex(samples_per_template=20), params_collected, patterns,
+                candidates=candidates)
+
+    # Every page with an ID shows User A's name in the banner; the tracking-parameter duplicate and
+    # the off-site link are not fetched
+    pages = ([f'/orders/{i}' for i in range(web_standin.ORDERS)] +
+             [f'/invoices/{i}' for i in range(web_standin.INVOICES)] + ['/news/1'])
+    assert set(params_collected) == {base + page for page in pages}
+    paths = [path for path, _ in shop.requests]
+    assert sorted(paths) == sorted(pages + ['/'])
+    assert {agent for _, agent in shop.requests} == {'standin-browser/A'}
+
+    load_b = hodor.page_loaders([web_standin.CookieDriver('B')], 1, http=True)[0]
+    findings = []
+    candidates.put(None)
+    hodor.idor_checker(load_b, candidates, patterns, set(), threading.Lock(), findings=findings)
+    # Leaked orders show User A's name; leaked invoices only match User A's page. The news page
+    # differs from User A's only in the banner, so it is not reported
+    assert sorted(findings) == sorted(f'{base}{page}' for page in ['/orders/0', '/orders/4', '/invoices/0', '/invoices/2'])
+
+
+def test_personalized_public_page_is_not_a_leak(shop):
+    base = f'http://127.0.0.1:{shop.server_address[1]}'
+    load_a = hodor.page_loaders([web_standin.CookieDriver('A')], 1, http=True)[0]
+    load_b = hodor.page_loaders([web_standin.CookieDriver('B')], 1, http=True)[0]
+    patterns = hodor.PatternSet(['alice'], ['alice', 'bob'])
+    reference = load_a(base + '/news/1', patterns=patterns).fingerprint
+    assert reference.matches == {'alice'}
+    verdict = hodor.check_idor(load_b, base + '/news/1', patterns, reference)
+    assert not verdict.idor
+    assert verdict.distance == 0
+
+
+class RedirectingLoginDriver:
+    """A browser whose login page redirects to ?next=/ and whose login completes a moment after the click."""
+
+    def __init__(self):
+        self.current_url = None
+        self.logged_in = False
+        self.submit = None
+
+    def get(self, url):
+        self.current_url = url + '?next=/'
+
+    def find_element(self, by, name):
+        element = LoginElement(self)
+        if name == 'submit':
+            self.submit = element
+        return element
+
+    def find_elements(self, by, selector):
+        return []
+
+    def execute_script(self, script, *args):
+        return 'complete'
+
+    def finish_login(self):
+        time.sleep(0.3)
+        self.logged_in = True
+        self.submit.stale = True
+        self.current_url = 'http://shop.invalid/account'
+
+
+class LoginElement:
+    def __init__(self, driver):
+        self.driver = driver
+        self.stale = False
+
+    def send_keys(self, keys):
+        pass
+
+    def is_enabled(self):
+        if self.stale:
+            raise StaleElementReferenceException()
+        return True
+
+    def click(self):
+        threading.Thread(target=self.driver.finish_login, daemon=True).start()
+
+
+def test_login_waits_for_submit_after_redirect():
+    driver = RedirectingLoginDriver()
+    assert hodor.login(driver, 'http://shop.invalid/login', 'alice', 'secret', 'username', 'password', 'submit',
+                       timeout=5)
+    assert driver.logged_in
@@ -0,0 +1,255 @@
+import asyncio
+import imaplib
+import time
+
+import pytest
+
+from conftest import load_script
+from imap_standin import FakeIMAP, IdleSession, LoginCounter, make_message
+
+omega = load_script('omega', 'Omega-3(D1).py')
+
+
+@pytest.fixture(autouse=True)
+def classifier():
+    omega.init_classifier()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = omega.CheckpointStore(str(tmp_path / 'state.db'))
+    yield store
+    store.close()
+
+
+def mailbox(count, **kwargs):
+    return FakeIMAP({uid: make_message(f"Message {uid}", f"Hello number {uid}") for uid in range(1, count + 1)},
+                    **kwargs)
+
+
+def test_parse_fetch_response_joins_header_and_text():
+    mail = mailbox(3)
+    typ, data = mail.uid('fetch', '1:3', omega.FETCH_ITEMS.format(max_bytes=100))
+    messages = omega.parse_fetch_response(data)
+    assert [uid for uid, _ in messages] == [1, 2, 3]
+    assert messages[0][1] == make_message("Message 1", "Hello number 1")
+
+
+def test_parse_fetch_response_with_uid_after_literal():
+    mail = mailbox(2, uid_last=True)
+    typ, data = mail.uid('fetch', '1:2', omega.FETCH_ITEMS.format(max_bytes=100))
+    assert omega.parse_fetch_response(data) == [(1, make_message("Message 1", "Hello number 1")),
+                                                (2, make_message("Message 2", "Hello number 2"))]
+
+
+def test_fetch_messages_batches_headers_and_truncated_text():
+    mail = mailbox(5)
+    messages = list(omega.fetch_messages(mail, [1, 2, 3, 4, 5], batch_size=2, max_bytes=5))
+    assert mail.fetches == [[1, 2], [3, 4], [5]]
+    # BODY.PEEK leaves the messages unseen
+    assert all('BODY.PEEK[HEADER]' in items and 'BODY.PEEK[TEXT]<0.5>' in items for items in mail.items)
+    assert messages[2] == (3, make_message("Message 3", "Hello"))
+
+
+def test_uid_set_compresses_ranges():
+    assert omega.uid_set([1, 2, 3, 5, 7, 8]) == '1:3,5,7:8'
+
+
+def scan(mail, store, **options):
+    return omega.scan_folder(mail, 'alice', 'inbox', store, omega.select_folder(mail, 'inbox'), **options)
+
+
+def test_select_folder_reads_uidvalidity_from_select_response():
+    mail = mailbox(3, uidvalidity=7)
+    assert omega.select_folder(mail, 'inbox') == 7
+
+
+def test_select_folder_without_uidvalidity_is_an_error():
+    mail = mailbox(3)
+    mail.select = lambda folder, readonly=False: ('OK', [b'3'])
+    with pytest.raises(imaplib.IMAP4.error):
+        omega.select_folder(mail, 'inbox')
+
+
+def test_scan_resumes_from_checkpoint(store):
+    mail = mailbox(4)
+    assert scan(mail, store, batch_size=2)[0] == 4
+    assert store.last_uid('alice', 'inbox', 1) == 4
+
+    mail.messages[5] = make_message("Message 5", "Hello number 5")
+    mail.fetches.clear()
+    assert scan(mail, store, batch_size=2)[0] == 1
+    assert mail.fetches == [[5]]
+
+
+def test_uidvalidity_change_restarts_scan(store):
+    scan(mailbox(3), store)
+    assert store.last_uid('alice', 'inbox', 2) == 0
+    assert scan(mailbox(3, uidvalidity=2), store)[0] == 3
+
+
+def test_refused_batch_keeps_checkpoint_before_it(store):
+    mail = mailbox(6, failures={1: 'NO'})
+    scanned, _ = scan(mail, store, batch_size=2)
+    assert scanned == 2
+    assert store.last_uid('alice', 'inbox', 1) == 2
+    # Nothing after the refused batch was fetched, and the next run picks up from UID 3
+    assert mail.fetches == [[1, 2], [3, 4]]
+    mail.failures.clear()
+    assert scan(mail, store, batch_size=2)[0] == 4
+
+
+def test_fetch_error_on_first_batch_saves_nothing(store):
+    mail = mailbox(4, failures={0: imaplib.IMAP4.error("BAD")})
+    assert scan(mail, store, batch_size=2)[0] == 0
+    assert store.last_uid('alice', 'inbox', 1) == 0
+
+
+def test_dropped_connection_is_raised(store, monkeypatch):
+    monkeypatch.setattr(omega, 'CLASSIFY_CHUNK', 2)
+    mail = mailbox(6, failures={1: imaplib.IMAP4.abort("socket closed")})
+    with pytest.raises(imaplib.IMAP4.abort):
+        scan(mail, store, batch_size=2)
+    # The batch scanned before the drop is kept, nothing past it
+    assert store.last_uid('alice', 'inbox', 1) == 2
+
+
+def test_cache_key_depends_on_sentiment_scorer():
+    body = "Your account is suspended, verify now"
+    omega.init_classifier(exact=True)
+    exact_key = omega.VerdictCache.key(body)
+    omega.init_classifier(exact=False)
+    assert omega.VerdictCache.key(body) != exact_key
+    assert omega.VerdictCache.key(body.upper()) == omega.VerdictCache.key(body)
+
+
+@pytest.fixture
+def logins(monkeypatch):
+    counter = LoginCounter()
+    monkeypatch.setattr(omega, 'connect', counter.connect)
+    return counter
+
+
+def test_pool_shares_one_slot_between_accounts(logins, monkeypatch):
+    def scan_selected(mail, username, folder, state_path, full, scan_options):
+        mail.use(username)
+        time.sleep(0.01)
+        return 1, []
+
+    monkeypatch.setattr(omega, 'scan_selected', scan_selected)
+    config = {'max_connections': {'imap.example.com': 1},
+              'accounts': [{'username': username, 'password': 'secret', 'server': 'imap.example.com',
+                            'folders': ['inbox', 'spam', 'archive']} for username in ('alice', 'bob')]}
+    reports = asyncio.run(asyncio.wait_for(omega.scan_accounts(config, 'state.db'), timeout=10))
+    assert [(r['account'], r['folder'], r['scanned'], r['error']) for r in reports] == [
+        (username, folder, 1, None) for username in ('alice', 'bob') for folder in ('inbox', 'spam', 'archive')]
+    assert logins.peak == {'imap.example.com': 1}
+    assert logins.open == {'imap.example.com': 0}
+    assert not logins.stale
+
+
+def test_pool_hands_closed_idle_slot_to_other_account(logins):
+    alice, bob = ({'username': username, 'password': 'secret', 'server': 'imap.example.com'}
+                  for username in ('alice', 'bob'))
+
+    async def use(pool, account):
+        mail = await pool.acquire(account)
+        mail.use(account['username'])
+        await asyncio.sleep(0.01)
+        await pool.release(account, mail)
+
+    async def run():
+        pool = omega.ConnectionPool({}, 1)
+        # Leave alice's session idle: bob only gets the slot if it is closed and handed over
+        await use(pool, alice)
+        await asyncio.gather(*(use(pool, bob) for _ in range(3)))
+        # Then both accounts compete for the slot bob's idle session holds
+        await asyncio.gather(*(use(pool, account) for account in (alice, bob, alice, bob, alice)))
+        await pool.close()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert logins.peak == {'imap.example.com': 1}
+    assert logins.open == {'imap.example.com': 0}
+    assert not logins.stale
+
+
+def idle(greeting, done_reply, timeout):
+    mail = IdleSession(greeting, done_reply)
+    try:
+        start = time.monotonic()
+        return omega.idle_wait(mail, timeout), time.monotonic() - start
+    finally:
+        mail.close()
+
+
+def test_idle_sees_notification_buffered_with_continuation():
+    # The EXISTS line arrives in the same packet as the continuation, so only the reader's buffer holds it
+    has_new, elapsed = idle(b'+ idling\r\n* 5 EXISTS\r\n', b'A1 OK IDLE terminated\r\n', timeout=5)
+    assert has_new
+    assert elapsed < 1
+
+
+def test_idle_keeps_notification_received_after_done():
+    has_new, _ = idle(b'+ idling\r\n', b'* 6 EXISTS\r\nA1 OK IDLE terminated\r\n', timeout=0.1)
+    assert has_new
+
+
+def test_idle_times_out_without_mail():
+    has_new, _ = idle(b'+ idling\r\n', b'A1 OK IDLE terminated\r\n', timeout=0.1)
+    assert not has_new
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_cache_counts_only_classified_messages(tmp_path, capsys, workers):
+    mbox = tmp_path / 'archive.mbox'
+    bodies = ["Verify your password now", "Lunch at noon?", "Verify your password now", "", "Lunch at noon?"]
+    mbox.write_bytes(b''.join(b'From someone\n' + make_message(f"Message {i}", body).replace(b'\r\n', b'\n') + b'\n'
+                              for i, body in enumerate(bodies)))
+    if workers:
+        with omega.ProcessPoolExecutor(workers, initializer=omega.init_classifier) as pool:
+            assert omega.scan_archive(str(mbox), pool) == 5
+    else:
+        assert omega.scan_archive(str(mbox)) == 5
+    # The empty body is neither a hit nor a miss
+    assert "Verdict cache: 2 hits, 2 misses" in capsys.readouterr().out
+
+
+def test_sentiment_error_is_not_cached_as_clean(monkeypatch):
+    raw = make_message("Update", "This is terrible and awful")
+    score_polarity = omega.score_polarity
+
+    def fail_once(texts):
+        monkeypatch.setattr(omega, 'score_polarity', score_polarity)
+        raise RuntimeError("scorer unavailable")
+
+    monkeypatch.setattr(omega, 'score_polarity', fail_once)
+    (subject, reasons, cached, error), = omega.classify_batch([raw])
+    assert isinstance(error, RuntimeError) and cached is None
+    (subject, reasons, cached, error), = omega.classify_batch([raw])
+    assert (reasons, cached, error) == (["negative sentiment"], False, None)
+
+
+@pytest.mark.parametrize('body', [
+    "very very bad",
+    "Your package could not be delivered. Very sorry!",
+    "Your account has been suspended. We are extremely sorry for the very serious inconvenience.",
+    "We regret that your payment failed. Please update your details.",
+    "I am not happy with the very poor service",
+    "not very good",
+    "Thanks for the lovely lunch, see you soon",
+    "very happy to help you today, a really great offer",
+    "not bad at all",
+])
+def test_lexicon_polarity_agrees_with_textblob(body):
+    textblob = pytest.importorskip('textblob')
+    if omega.load_lexicon() is None:
+        pytest.skip("sentiment lexicon unavailable")
+    expected = textblob.TextBlob(body).sentiment.polarity
+    polarity, = omega.score_polarity([body])
+    assert (polarity > 0) == (expected > 0) and (polarity < 0) == (expected < 0)
+    assert polarity == pytest.approx(expected, abs=0.05)
+
+
+def test_lexicon_modifiers_stay_within_each_text():
+    bodies = ["This is very", "bad news", "good", "! sorry"]
+    assert omega.score_polarity(bodies) == pytest.approx([omega.score_polarity([body])[0] for body in bodies])
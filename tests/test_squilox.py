@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+import requests
+
+import sqli_standin
+import squilox
+import squilox2
+
+
+@pytest.fixture(params=[squilox, squilox2], ids=['squilox', 'squilox2'])
+def scanner(request):
+    return request.param
+
+
+def run_with_timeout(func, *args, timeout=5):
+    result = []
+    worker = threading.Thread(target=lambda: result.append(func(*args)), daemon=True)
+    worker.start()
+    worker.join(timeout)
+    assert result, f"{func.__name__}{args} did not return within {timeout}s"
+    return result[0]
+
+
+@pytest.mark.parametrize('pattern, anchor', [
+    (r"unexpected { token", "unexpected { token"),
+    (r"ab{", "ab{"),
+    (r"foo{}bar", "foo{}bar"),
+    (r"\bORA-\d{5}", "ora-"),
+    (r"abc{2,3}defg", "defg"),
+    (r"x{,}yyyy", "yyyy"),
+    (r"CLI Driver.{0,40}DB2", "cli driver"),
+    (r"Warning: mysqli?_", "warning: mysql"),
+    (r"ERROR:\s+syntax error at or near", "syntax error at or near"),
+    (r"a|b", None),
+    (r"syntax\x20error at", "syntax error at"),
+    (r"\u0053QL\U00000020error", "sql error"),
+    (r"\N{LATIN SMALL LETTER Q}uery failed", "query failed"),
+    (r"syntax\040error", "syntax error"),
+    (r"can\047t parse", "can't parse"),
+    (r"(x)\1 repeated", " repeated"),
+])
+def test_literal_anchor(scanner, pattern, anchor):
+    assert run_with_timeout(scanner.literal_anchor, pattern) == anchor
+
+
+def test_error_signatures_with_literal_brace(scanner):
+    signatures = scanner.ErrorSignatures({'Custom': [r"unexpected { token"], 'Oracle': [r"\bORA-\d{5}"]})
+    assert signatures.search("Parse error: Unexpected { TOKEN near line 3") == {'Custom'}
+    assert signatures.search("ORA-01756: quoted string") == {'Oracle'}
+    assert signatures.search("all good") == frozenset()
+
+
+def test_error_signatures_with_escaped_characters(scanner):
+    signatures = scanner.ErrorSignatures({'Custom': [r"syntax\x20error at"]})
+    assert signatures.search("Syntax error at line 1") == {'Custom'}
+
+
+def test_time_finding_reports_latency_deviation(scanner):
+    latency = scanner.LatencyProfile([0.1, 0.2, 0.1, 0.2], z=4.0, min_delay=0.5)
+    baseline = scanner.Baseline(frozenset([scanner.response_digest("ok")]), frozenset(), latency)
+    result = scanner.analyze_response("ok", baseline, 'time', 1.15)
+    assert result == "Possible time-based SQL injection (1.15s, 20.0 sd above the 0.150s mean)"
+    assert result.startswith(scanner.confirmed_results)
+    # A time-based payload that is not slow is still checked for errors and changed content
+    assert scanner.analyze_response("ok", baseline, 'time', 0.2) == "No change"
+    assert scanner.analyze_response("changed", baseline, 'time', 0.2).startswith("Response changed")
+
+
+@pytest.fixture(params=[True], ids=['threaded'])
+def login_app(request):
+    server = sqli_standin.serve(threaded=request.param)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def scan(scanner, login_app, kinds):
+    forms = [sqli_standin.login_form(scanner, login_app, kind) for kind in kinds]
+    findings = scanner.test_forms(requests.Session(), forms, samples=3, min_delay=sqli_standin.DELAY / 2)
+    return {(job.form.action.rsplit('/', 1)[-1], job.field, job.payload_type) for job in findings}
+
+
+# What the scanner submits when it is not injecting into a field
+BASELINE_FIELDS = {'user': 'invalid', 'pw': 'invalid', 'csrf': 'token-1', 'go': 'Log in'}
+
+
+def submitted(login_app, kind, field):
+    """The payloads the app received in one field of one form."""
+    return [dict(fields)[field] for form_kind, fields in login_app.submissions
+            if form_kind == kind and dict(fields)[field] != BASELINE_FIELDS[field]]
+
+
+def test_form_replay_payload_matrix(scanner, login_app):
+    assert scan(scanner, login_app, ['safe']) == set()
+    # Every field but the submit button gets every payload once
+    for field in ('user', 'pw', 'csrf'):
+        assert sorted(submitted(login_app, 'safe', field)) == sorted(
+            payload for payload_type in scanner.payload_order for payload in scanner.payloads[payload_type])
+    # The other fields are sent as a browser would, hidden values and the submit button included
+    for _, fields in login_app.submissions:
+        assert [name for name, _ in fields] == list(BASELINE_FIELDS)
+        assert sum(value != BASELINE_FIELDS[name] for name, value in fields) <= 1
+
+
+@pytest.mark.parametrize('login_app', [True, False], ids=['threaded', 'single-worker'], indirect=True)
+def test_form_replay_finds_error_and_time_injections(scanner, login_app):
+    findings = scan(scanner, login_app, ['error', 'time'])
+    assert ('error', 'user', 'error') in findings
+    assert ('time', 'user', 'time') in findings
+    assert {field for _, field, _ in findings} == {'user'}
+
+
+def test_confirmed_field_stops_early(scanner, login_app):
+    scan(scanner, login_app, ['error'])
+    # The error class confirms the injection in user, so the later classes only go to the other fields
+    assert sorted(submitted(login_app, 'error', 'user')) == sorted(scanner.payloads['error'])
+    assert len(submitted(login_app, 'error', 'pw')) == sum(map(len, scanner.payloads.values()))
+
+
+@pytest.mark.parametrize('field, payload, confirmed', [
+    ('user', "' OR 1=1 --", True),
+    ('pw', "' OR 1=1 --", False),
+    # Hidden fields can't be typed into; the value is set by script and the app ignores it
+    ('csrf', "' OR 1=1 --", False),
+    ('missing', "' OR 1=1 --", False),
+])
+def test_confirm_finding_in_browser(scanner, login_app, field, payload, confirmed):
+    form = sqli_standin.login_form(scanner, login_app, 'error')
+    assert scanner.confirm_finding(sqli_standin.BrowserStandin(), form, field, payload, 'error') is confirmed
+
+
+def test_frontier_spills_in_order_and_deduplicates_in_fixed_memory(scanner):
+    frontier = scanner.Frontier(max_memory=10, max_urls=1000)
+    filter_size = len(frontier.seen.bits)
+    try:
+        for i in range(100):
+            assert frontier.push(f'http://site.invalid/p/{i}', i)
+        # Duplicates are recognised after normalization, including ones already spilled to disk
+        assert not frontier.push('HTTP://site.invalid/p/5#top', 0)
+        assert not frontier.push('http://site.invalid/p/99?utm_source=mail', 0)
+        assert len(frontier) == 100
+        assert [frontier.pop() for _ in range(100)] == [(f'http://site.invalid/p/{i}', i) for i in range(100)]
+        assert len(frontier.seen.bits) == filter_size
+    finally:
+        frontier.close()
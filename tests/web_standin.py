@@ -0,0 +1,85 @@
+"""A small shop served over HTTP for the IDOR scanner: two users, their orders and invoices, and broken access checks."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SESSIONS = {'A': 'alice', 'B': 'bob'}
+ORDERS = 8
+INVOICES = 4
+
+# A public page, the same for everyone apart from the signed-in banner
+NEWS = ' '.join(f"Store update {i}: new arrivals in aisle {i % 7}, opening hours unchanged, "
+                f"free delivery on orders over forty pounds this week." for i in range(15))
+
+LINE_ITEMS = ' '.join(f"Item {i}: {['lamp', 'rug', 'chair', 'shelf', 'mirror'][i % 5]} at {10 + i} pounds, "
+                      f"delivered to 12 Long Street, Springfield." for i in range(15))
+
+
+def order_owner(number):
+    return SESSIONS['A'] if number % 2 == 0 else SESSIONS['B']
+
+
+def order_leaks(number):
+    """Orders divisible by 4 are shown to any signed-in user."""
+    return number % 4 == 0
+
+
+class ShopHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('User-Agent')))
+        cookie = self.headers.get('Cookie', '')
+        user = next((name for sid, name in SESSIONS.items() if f'sid={sid}' in cookie), None)
+        kind, _, number = self.path.split('?')[0].strip('/').partition('/')
+        if kind == '':
+            links = ''.join(f'<a href="/orders/{i}">Order {i}</a>' for i in range(ORDERS))
+            links += ''.join(f'<a href="/invoices/{i}">Invoice {i}</a>' for i in range(INVOICES))
+            body = (f'{links}<a href="/news/1">News</a><a href="/orders/1?utm_source=mail">Again</a>'
+                    f'<a href="http://elsewhere.invalid/">Out</a>')
+        elif kind == 'news' and number.isdigit():
+            body = f'<h1>News</h1><p>{NEWS}</p>'
+        elif kind == 'orders' and number.isdigit():
+            owner = order_owner(int(number))
+            if user is not None and (user == owner or order_leaks(int(number))):
+                body = (f'<h1>Order {number}</h1><p>Shipped to {owner}@example.com, 12 Long Street, Springfield.</p>'
+                        f'<p>Two items, paid by card ending 4242.</p>')
+            else:
+                body = '<h1>Forbidden</h1><p>You cannot view this order.</p>'
+        elif kind == 'invoices' and number.isdigit():
+            # Invoices are shown to anyone, but only the owner sees whose they are
+            owner = order_owner(int(number))
+            customer = f'<p>Billed to {owner}.</p>' if user == owner else ''
+            body = f'<h1>Invoice {number}</h1>{customer}<p>{LINE_ITEMS}</p>'
+        else:
+            self.send_error(404)
+            return
+        banner = f'<p>Signed in as {user}</p>' if user else ''
+        data = f'<html><body>{banner}{body}<a href="/">Home</a></body></html>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve():
+    """Start the shop on a free port; returns the server, whose requests list logs (path, user agent)."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ShopHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class CookieDriver:
+    """The parts of a logged-in browser that the HTTP mode reads: its cookies and user agent."""
+
+    def __init__(self, sid):
+        self.sid = sid
+
+    def get_cookies(self):
+        return [{'name': 'sid', 'value': self.sid, 'path': '/'}]
+
+    def execute_script(self, script, *args):
+        assert script == "return navigator.userAgent"
+        return f'standin-browser/{self.sid}'